@@ -3,9 +3,13 @@ import uvicorn
 from settings import settings
 
 
-uvicorn.run(
-    'app:app',
-    host=settings.server_host,
-    port=settings.server_port,
-    reload=True,
-)
\ No newline at end of file
+if settings.server_mode == 'production':
+    from server import serve
+    serve()
+else:
+    uvicorn.run(
+        'app:app',
+        host=settings.server_host,
+        port=settings.server_port,
+        reload=True,
+    )
\ No newline at end of file
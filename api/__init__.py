@@ -2,8 +2,10 @@ from fastapi import APIRouter
 
 from .api_v1 import router as v1_router
 from .api_exceptions import router as exception_router
+from .api_service import router as service_router
 
 router = APIRouter()
 
 router.include_router(v1_router)
 router.include_router(exception_router)
+router.include_router(service_router)
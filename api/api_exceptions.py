@@ -1,11 +1,28 @@
-from fastapi import APIRouter, status, Depends
+from typing import Optional
 
-from models import DeclensionExceptionCreate, DeclensionException, DeclensionExceptionUpdate
+from fastapi import APIRouter, status, Depends, Request, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+
+from models import DeclensionExceptionCreate, DeclensionException, DeclensionExceptionUpdate, ExceptionsImportResult, \
+    ExceptionsFilter, ExceptionsCount
 from services import DeclensionExceptionsService
+from services.exceptions_io import read_records, import_media_types, format_header, format_page, ExportFormat
+from settings import settings
+from .dependencies import get_exceptions_service
 
 
 router = APIRouter(prefix='/exceptions', tags=['exceptions'])
 
+next_page_header = 'X-Next-After-Id'
+
+
+async def list_exceptions_page(response: Response, declension_service: DeclensionExceptionsService,
+                               filters: ExceptionsFilter, after_id: Optional[int], limit: int):
+    sentences = await declension_service.list_exceptions(filters, after_id, limit)
+    if len(sentences) == limit:
+        response.headers[next_page_header] = str(sentences[-1].id)
+    return sentences
+
 
 @router.post(
     "/",
@@ -15,32 +32,101 @@ router = APIRouter(prefix='/exceptions', tags=['exceptions'])
 )
 async def add_exception(
     request: DeclensionExceptionCreate,
-    declension_service: DeclensionExceptionsService = Depends()
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
     return await declension_service.create_exception(request)
 
 
+@router.post(
+    "/import",
+    response_model=ExceptionsImportResult,
+    openapi_extra={
+        'requestBody': {
+            'required': True,
+            'content': {media_type: {'schema': DeclensionExceptionUpdate.model_json_schema()}
+                        for media_type in import_media_types},
+        }
+    },
+    description="Загрузить исключения из JSON (массив), NDJSON или CSV по заголовку Content-Type. "
+                "Записи в формате выгрузки, поле id не используется"
+)
+async def import_exceptions(
+    request: Request,
+    overwrite: bool = True,
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
+):
+    content_type = request.headers.get('content-type', 'application/x-ndjson').split(';')[0].strip()
+    if content_type not in import_media_types:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    records = read_records(request.stream(), import_media_types[content_type], settings.stream_max_line_length)
+    return await declension_service.import_exceptions(records, overwrite, settings.exceptions_import_batch_size)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={status.HTTP_200_OK: {'content': {'application/x-ndjson': {}, 'text/csv': {}}}},
+    description="Выгрузить исключения в NDJSON или CSV, при указании system - только для одной системы"
+)
+async def export_exceptions(
+    system: Optional[str] = None,
+    format: ExportFormat = 'ndjson',
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
+):
+    async def content():
+        yield format_header(format)
+        async for page in declension_service.export_exceptions(system, settings.exceptions_export_page_size):
+            yield format_page(page, format)
+
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(content(), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="exceptions.{format}"'})
+
+
+@router.get(
+    "/count",
+    response_model=ExceptionsCount,
+    description="Количество исключений по фильтрам"
+)
+async def count_exceptions(
+    filters: ExceptionsFilter = Depends(),
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
+):
+    return ExceptionsCount(count=await declension_service.count_exceptions(filters))
+
+
 @router.get(
     "/",
     response_model=list[DeclensionException],
-    description="Вывести все исключения"
+    description=f"Вывести исключения по фильтрам страницами по возрастанию id. Если есть следующая страница, "
+                f"заголовок {next_page_header} содержит значение after_id для нее"
 )
 async def list_all_exceptions(
-    declension_service: DeclensionExceptionsService = Depends()
+    response: Response,
+    filters: ExceptionsFilter = Depends(),
+    after_id: Optional[int] = Query(default=None, description='id последнего исключения предыдущей страницы'),
+    limit: int = Query(default=settings.exceptions_page_size, ge=1, le=settings.exceptions_page_max_size),
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
-    return await declension_service.list_all_exceptions()
+    return await list_exceptions_page(response, declension_service, filters, after_id, limit)
 
 
 @router.get(
     "/{system}",
     response_model=list[DeclensionException],
-    description="Вывести исключения для одной системы"
+    description=f"Вывести исключения для одной системы страницами по возрастанию id. Если есть следующая страница, "
+                f"заголовок {next_page_header} содержит значение after_id для нее"
 )
 async def list_exceptions_within_one_system(
     system: str,
-    declension_service: DeclensionExceptionsService = Depends()
+    response: Response,
+    filters: ExceptionsFilter = Depends(),
+    after_id: Optional[int] = Query(default=None, description='id последнего исключения предыдущей страницы'),
+    limit: int = Query(default=settings.exceptions_page_size, ge=1, le=settings.exceptions_page_max_size),
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
-    return await declension_service.list_exceptions_within_system(system)
+    filters.system = system
+    return await list_exceptions_page(response, declension_service, filters, after_id, limit)
 
 
 @router.delete(
@@ -50,7 +136,7 @@ async def list_exceptions_within_one_system(
 )
 async def delete_exception(
     exception_id: int,
-    declension_service: DeclensionExceptionsService = Depends()
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
     return await declension_service.delete_exception(exception_id)
 
@@ -63,6 +149,6 @@ async def delete_exception(
 async def update_exception(
     exception_id: int,
     request: DeclensionExceptionUpdate,
-    declension_service: DeclensionExceptionsService = Depends()
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
     return await declension_service.update_exception(exception_id, request)
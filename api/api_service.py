@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Response, status
+from fastapi.responses import PlainTextResponse
+
+from models import ReadinessResult
+from services import morphology
+from services.metrics import registry
+from settings import settings
+
+
+router = APIRouter(tags=['service'])
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    description="Метрики сервиса в формате Prometheus"
+)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
+@router.get(
+    "/ready",
+    response_model=ReadinessResult,
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {'model': ReadinessResult}},
+    description="Готовность сервиса: словари морфологии загружены и прогреты"
+)
+async def get_readiness(response: Response):
+    loaded = morphology.is_loaded()
+    ready = loaded or settings.morph_load_mode == 'lazy'
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return ReadinessResult(ready=ready, morphology_loaded=loaded)
@@ -1,35 +1,189 @@
-from fastapi import APIRouter, status, Depends
+from typing import Annotated, AsyncIterator
 
-from models import PersonNameDeclension, TextDeclension, CommonResult, DeclensionExceptionCreate, DeclensionException
+from fastapi import APIRouter, status, Depends, Body, Request, Response
+from starlette.requests import ClientDisconnect
+
+from models import PersonNameDeclension, TextDeclension, CommonResult, DeclensionExceptionCreate, DeclensionException, \
+    BatchResult, PersonNameParadigm, TextParadigm, ParadigmResult
 from services import DeclensionNameService, DeclensionTextService, DeclensionExceptionsService
+from services.streaming import decline_stream
+from settings import settings
+from utils.ndjson import iter_lines, NDJSONStreamingResponse
+from .caching import make_etag, check_preconditions
+from .dependencies import get_name_service, get_text_service, get_exceptions_service
 
 
 router = APIRouter()
 
 
+def ndjson_body(model) -> dict:
+    return {
+        'requestBody': {
+            'required': True,
+            'content': {'application/x-ndjson': {'schema': model.model_json_schema()}},
+        }
+    }
+
+
+async def conditional_result(http_request: Request, response: Response, request, db: DeclensionExceptionsService,
+                             decline):
+    """Склонение с ETag; без индекса исключений в памяти версия неизвестна и ETag не передается"""
+    version = await db.get_version()
+    if version is not None:
+        if cached := check_preconditions(http_request, response, make_etag(request, version)):
+            return cached
+    return await decline(request)
+
+
+async def stream_results(request: Request, model, decline_batch) -> AsyncIterator[bytes]:
+    lines = iter_lines(request.stream(), settings.stream_max_line_length)
+    try:
+        async for chunk in decline_stream(lines, model, decline_batch, settings.stream_chunk_size):
+            yield chunk
+    except ClientDisconnect:
+        return
+
+
 @router.post(
     "/person_name",
     response_model=CommonResult,
+    responses={status.HTTP_412_PRECONDITION_FAILED: {'description': 'Передан совпадающий If-None-Match'}},
     description="Склонение имен, фамилий"
 )
 async def decline_person_name(
     request: PersonNameDeclension,
-    declension_service: DeclensionNameService = Depends()
+    http_request: Request,
+    response: Response,
+    declension_service: DeclensionNameService = Depends(get_name_service)
+):
+    return await conditional_result(http_request, response, request, declension_service.db,
+                                    declension_service.get_inflected_person_name)
+
+
+@router.get(
+    "/person_name",
+    response_model=CommonResult,
+    responses={status.HTTP_304_NOT_MODIFIED: {'description': 'Результат не изменился (If-None-Match)'}},
+    description="Склонение имен, фамилий с параметрами в строке запроса, поддерживает кэширование по ETag"
+)
+async def get_person_name(
+    http_request: Request,
+    response: Response,
+    request: PersonNameDeclension = Depends(),
+    declension_service: DeclensionNameService = Depends(get_name_service)
 ):
-    return await declension_service.get_inflected_person_name(request)
+    return await conditional_result(http_request, response, request, declension_service.db,
+                                    declension_service.get_inflected_person_name)
+
+
+@router.post(
+    "/person_name/batch",
+    response_model=list[BatchResult],
+    description="Пакетное склонение имен, фамилий. Результаты возвращаются в порядке запросов"
+)
+async def decline_person_names(
+    requests: Annotated[list[PersonNameDeclension], Body(max_length=settings.batch_max_size)],
+    declension_service: DeclensionNameService = Depends(get_name_service)
+):
+    return await declension_service.get_inflected_person_names(requests)
+
+
+@router.post(
+    "/person_name/stream",
+    response_class=NDJSONStreamingResponse,
+    openapi_extra=ndjson_body(PersonNameDeclension),
+    description="Потоковое склонение имен, фамилий: запросы и результаты в формате NDJSON, по строке на запись. "
+                "Результаты возвращаются в порядке запросов по мере склонения"
+)
+async def decline_person_names_stream(
+    request: Request,
+    declension_service: DeclensionNameService = Depends(get_name_service)
+):
+    return NDJSONStreamingResponse(
+        stream_results(request, PersonNameDeclension, declension_service.get_inflected_person_names))
+
+
+@router.post(
+    "/person_name/paradigm",
+    response_model=ParadigmResult,
+    description="Склонение имен, фамилий сразу в нескольких падежах"
+)
+async def decline_person_name_paradigm(
+    request: PersonNameParadigm,
+    declension_service: DeclensionNameService = Depends(get_name_service)
+):
+    return await declension_service.get_person_name_paradigm(request)
 
 
 @router.post(
     "/",
     response_model=CommonResult,
+    responses={status.HTTP_412_PRECONDITION_FAILED: {'description': 'Передан совпадающий If-None-Match'}},
     description="Склонение общих слов",
 
 )
 async def decline_text(
     request: TextDeclension,
-    declension_service: DeclensionTextService = Depends()
+    http_request: Request,
+    response: Response,
+    declension_service: DeclensionTextService = Depends(get_text_service)
+):
+    return await conditional_result(http_request, response, request, declension_service.db,
+                                    declension_service.get_inflected_text)
+
+
+@router.get(
+    "/",
+    response_model=CommonResult,
+    responses={status.HTTP_304_NOT_MODIFIED: {'description': 'Результат не изменился (If-None-Match)'}},
+    description="Склонение общих слов с параметрами в строке запроса, поддерживает кэширование по ETag"
+)
+async def get_text(
+    http_request: Request,
+    response: Response,
+    request: TextDeclension = Depends(),
+    declension_service: DeclensionTextService = Depends(get_text_service)
+):
+    return await conditional_result(http_request, response, request, declension_service.db,
+                                    declension_service.get_inflected_text)
+
+
+@router.post(
+    "/batch",
+    response_model=list[BatchResult],
+    description="Пакетное склонение общих слов. Результаты возвращаются в порядке запросов"
+)
+async def decline_texts(
+    requests: Annotated[list[TextDeclension], Body(max_length=settings.batch_max_size)],
+    declension_service: DeclensionTextService = Depends(get_text_service)
+):
+    return await declension_service.get_inflected_texts(requests)
+
+
+@router.post(
+    "/stream",
+    response_class=NDJSONStreamingResponse,
+    openapi_extra=ndjson_body(TextDeclension),
+    description="Потоковое склонение общих слов: запросы и результаты в формате NDJSON, по строке на запись. "
+                "Результаты возвращаются в порядке запросов по мере склонения"
+)
+async def decline_texts_stream(
+    request: Request,
+    declension_service: DeclensionTextService = Depends(get_text_service)
+):
+    return NDJSONStreamingResponse(stream_results(request, TextDeclension, declension_service.get_inflected_texts))
+
+
+@router.post(
+    "/paradigm",
+    response_model=ParadigmResult,
+    description="Склонение общих слов сразу в нескольких падежах"
+)
+async def decline_text_paradigm(
+    request: TextParadigm,
+    declension_service: DeclensionTextService = Depends(get_text_service)
 ):
-    return await declension_service.get_inflected_text(request)
+    return await declension_service.get_text_paradigm(request)
 
 
 @router.post(
@@ -40,7 +194,7 @@ async def decline_text(
 )
 async def add_exception(
     request: DeclensionExceptionCreate,
-    declension_service: DeclensionExceptionsService = Depends()
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
     return await declension_service.create_exception(request)
 
@@ -51,6 +205,6 @@ async def add_exception(
     description="Возвращает имена систем"
 )
 async def list_systems(
-    declension_service: DeclensionExceptionsService = Depends()
+    declension_service: DeclensionExceptionsService = Depends(get_exceptions_service)
 ):
     return await declension_service.list_systems()
@@ -0,0 +1,79 @@
+import hashlib
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request, Response, status
+from pydantic import BaseModel
+
+from settings import settings
+
+
+root = Path(__file__).parent.parent
+
+# Код и данные, от которых зависит результат склонения
+fingerprint_sources = ['services', 'utils', 'data']
+fingerprint_packages = ['pymorphy3', 'pymorphy3-dicts-ru', 'nltk']
+
+
+@lru_cache(maxsize=8)
+def _file_digest(path: str) -> bytes:
+    """Содержимое файла данных, заданного в настройках, например правил склонения фамилий вне data/"""
+    path = Path(path)
+    try:
+        return hashlib.blake2b((path if path.is_absolute() else root / path).read_bytes(), digest_size=16).digest()
+    except OSError:
+        return b''
+
+
+@lru_cache(maxsize=1)
+def get_fingerprint() -> bytes:
+    """Версия кода сервиса, словарей и таблиц склонения: меняется с любым их обновлением"""
+    digest = hashlib.blake2b(digest_size=16)
+    for package in fingerprint_packages:
+        try:
+            digest.update(f'{package}={metadata.version(package)};'.encode())
+        except metadata.PackageNotFoundError:
+            pass
+    for source in fingerprint_sources:
+        for path in sorted((root / source).rglob('*')):
+            if path.is_file() and path.suffix != '.pyc':
+                digest.update(str(path.relative_to(root)).encode())
+                digest.update(path.read_bytes())
+    return digest.digest()
+
+
+def make_etag(request: BaseModel, version: int) -> str:
+    """
+    ETag результата склонения: результат определяется полями запроса, версией набора исключений, версией кода
+    и словарей и настройками склонения
+    """
+    digest = hashlib.blake2b(request.model_dump_json().encode(), digest_size=16)
+    digest.update(get_fingerprint())
+    digest.update(_file_digest(settings.surname_rules_path))
+    digest.update(f':{version}:{settings.male_common_name}:{settings.female_common_name}:'
+                  f'{settings.names_table_enabled}:{settings.exceptions_max_words}'.encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    max_age = settings.response_cache_max_age
+    return {'ETag': etag, 'Cache-Control': f'max-age={max_age}' if max_age else 'no-cache'}
+
+
+def check_preconditions(http_request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Проверка If-None-Match по RFC 9110: при совпадении для GET - ответ 304, для остальных методов - 412.
+    Иначе в ответ добавляются заголовки кэширования
+    """
+    headers = cache_headers(etag)
+    if_none_match = http_request.headers.get('if-none-match')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if '*' in tags or etag in tags:
+            if http_request.method == 'GET':
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+    response.headers.update(headers)
+    return None
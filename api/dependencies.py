@@ -0,0 +1,28 @@
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from services import DeclensionNameService, DeclensionTextService, DeclensionExceptionsService, morphology
+
+
+def init_services(app: FastAPI, session_factory: async_sessionmaker[AsyncSession],
+                  read_session_factory: Optional[async_sessionmaker[AsyncSession]] = None) -> None:
+    exceptions_service = DeclensionExceptionsService(session_factory, read_session_factory)
+    app.state.exceptions_service = exceptions_service
+    app.state.name_service = DeclensionNameService(exceptions_service)
+    app.state.text_service = DeclensionTextService(exceptions_service)
+
+
+def get_exceptions_service(request: Request) -> DeclensionExceptionsService:
+    return request.app.state.exceptions_service
+
+
+async def get_name_service(request: Request) -> DeclensionNameService:
+    await morphology.ensure_loaded()
+    return request.app.state.name_service
+
+
+async def get_text_service(request: Request) -> DeclensionTextService:
+    await morphology.ensure_loaded()
+    return request.app.state.text_service
@@ -1,10 +1,22 @@
+import asyncio
+import logging
+
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 from contextlib import asynccontextmanager
 
 import api
-from database import engine
-from tables import Base
+from api.dependencies import init_services
+from database import engine, Session, ReadSession, run_migrations
+from services import morphology
+from services.exceptions_cache import exceptions_cache
+from services.exceptions_notifications import ExceptionsListener
+from services.executor import declension_executor
+from services.metrics import register_pool_metrics
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
 
 
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
@@ -15,9 +27,36 @@ def use_route_names_as_operation_ids(app: FastAPI) -> None:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    init_services(app, Session, ReadSession)
+    if settings.db_migrate_on_startup:
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+    listener = None
+    if settings.exceptions_cache_enabled and settings.exceptions_notify_enabled:
+        # Подписка до загрузки индекса, чтобы не пропустить изменения между загрузкой и подпиской
+        listener = ExceptionsListener(engine)
+        listener.start()
+        try:
+            await asyncio.wait_for(listener.listening.wait(), settings.exceptions_notify_connect_timeout)
+        except asyncio.TimeoutError:
+            # Подписка продолжает попытки в фоне, до ее установки индекс перечитывается по ttl
+            logger.warning('Не удалось подписаться на уведомления об изменении исключений за %s с',
+                           settings.exceptions_notify_connect_timeout)
+    if settings.exceptions_cache_enabled:
+        async with Session() as session:
+            await exceptions_cache.refresh(session, force=True)
+    if settings.morph_load_mode == 'startup':
+        morphology.preload()
+    elif settings.morph_load_mode == 'background':
+        app.state.morph_loading = asyncio.create_task(asyncio.to_thread(morphology.preload))
+    declension_executor.start()
+    if settings.metrics_enabled:
+        register_pool_metrics(engine.pool)
     yield
+    if listener is not None:
+        await listener.stop()
+    # Ожидание завершения выполняемых задач пула не блокирует цикл событий
+    await asyncio.to_thread(declension_executor.shutdown)
 
 
 tags_metadata = [
@@ -28,9 +67,17 @@ tags_metadata = [
     {
         'name': 'exceptions',
         'description': 'Работа с исключениями'
+    },
+    {
+        'name': 'service',
+        'description': 'Состояние сервиса'
     }
 ]
 
+if settings.morph_load_mode == 'preload':
+    # Загрузка до fork воркеров (например, gunicorn --preload): словари остаются общими для процессов
+    morphology.preload(freeze=True)
+
 app = FastAPI(openapi_tags=tags_metadata, title='Сервис склонений', lifespan=lifespan)
 app.include_router(api.router)
 use_route_names_as_operation_ids(app)
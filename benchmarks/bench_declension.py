@@ -0,0 +1,144 @@
+"""
+Бенчмарк горячих путей склонения. Запуск из корня репозитория:
+
+    python -m benchmarks.bench_declension [--iterations 2000] [--seed 0] [--only person_name ...]
+
+Исключения хранятся в SQLite в памяти, Postgres не нужен.
+Для каждого замера выводится пропускная способность и задержка p50/p99.
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Awaitable
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from sqlalchemy.pool import StaticPool
+
+from models import PersonNameDeclension, TextDeclension
+from services import DeclensionNameService, DeclensionTextService, DeclensionExceptionsService
+from services.exceptions_cache import exceptions_cache
+from services.executor import declension_executor
+from services.morphology import get_inflected_word, parse_cache, inflect_cache
+from settings import settings
+from tables import Base, Sentence, make_lookup_key
+from utils.casing_manager import apply_cases
+from . import corpus
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    timings_ns: list[int] = field(default_factory=list)
+
+    def percentile(self, q: float) -> float:
+        values = sorted(self.timings_ns)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def report(self) -> str:
+        total_s = sum(self.timings_ns) / 1e9
+        return (f'{self.name:<32} {len(self.timings_ns) / total_s:>12.0f} ops/s'
+                f' {self.percentile(0.5) / 1e3:>10.1f} us p50 {self.percentile(0.99) / 1e3:>10.1f} us p99')
+
+
+def measure(name: str, workload: list, func: Callable, setup: Callable[[], None] = None) -> BenchmarkResult:
+    result = BenchmarkResult(name)
+    for args in workload:
+        if setup:
+            setup()
+        start = time.perf_counter_ns()
+        func(*args)
+        result.timings_ns.append(time.perf_counter_ns() - start)
+    return result
+
+
+async def measure_async(name: str, workload: list, func: Callable[..., Awaitable]) -> BenchmarkResult:
+    result = BenchmarkResult(name)
+    for args in workload:
+        start = time.perf_counter_ns()
+        await func(*args)
+        result.timings_ns.append(time.perf_counter_ns() - start)
+    return result
+
+
+async def create_exceptions_service(engine: AsyncEngine) -> DeclensionExceptionsService:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as session:
+        session.add_all([
+            Sentence(source_text=source_text, case=case, gender=gender, number='sing', result=result,
+                     lookup_key=make_lookup_key(None, case, gender, 'sing'))
+            for source_text, case, gender, result in corpus.exceptions
+        ])
+        await session.commit()
+    return DeclensionExceptionsService(session_factory)
+
+
+def clear_morph_caches():
+    parse_cache.clear()
+    inflect_cache.clear()
+
+
+async def run(iterations: int, seed: int, only: list[str]) -> list[BenchmarkResult]:
+    rnd = random.Random(seed)
+    words = [word for text in corpus.fullnames + corpus.texts for word in text.split()]
+    word_workload = [(rnd.choice(words), {rnd.choice(corpus.cases), 'sing'}) for _ in range(iterations)]
+    name_workload = [(rnd.choice(corpus.fullnames), rnd.choice(corpus.cases)) for _ in range(iterations)]
+    text_workload = [(rnd.choice(corpus.texts), rnd.choice(corpus.cases)) for _ in range(iterations)]
+    casing_workload = [(text, text.lower()) for text, _ in text_workload]
+    long_texts = [' '.join(rnd.choice(corpus.casing_words) for _ in range(200)) for _ in range(iterations // 10 or 1)]
+    long_casing_workload = [(text, text.lower() + 'а') for text in long_texts]
+
+    engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+    exceptions_service = await create_exceptions_service(engine)
+    name_service = DeclensionNameService(exceptions_service)
+    text_service = DeclensionTextService(exceptions_service)
+
+    async def decline_name(fullname: str, case: str):
+        await name_service.get_inflected_person_name(PersonNameDeclension(fullname=fullname, case=case))
+
+    async def decline_text(source_text: str, case: str):
+        await text_service.get_inflected_text(TextDeclension(source_text=source_text, case=case))
+
+    def selected(name: str) -> bool:
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results = []
+    if selected('get_inflected_word'):
+        results.append(measure('get_inflected_word[cold]', word_workload, get_inflected_word, clear_morph_caches))
+        for args in word_workload:
+            get_inflected_word(*args)
+        results.append(measure('get_inflected_word[warm]', word_workload, get_inflected_word))
+    for cache_enabled, label in ((True, 'index'), (False, 'db')):
+        settings.exceptions_cache_enabled = cache_enabled
+        exceptions_cache.invalidate()
+        if selected('person_name'):
+            clear_morph_caches()
+            results.append(await measure_async(f'person_name[{label}]', name_workload, decline_name))
+        if selected('text'):
+            clear_morph_caches()
+            results.append(await measure_async(f'text[{label}]', text_workload, decline_text))
+    if selected('apply_cases'):
+        results.append(measure('apply_cases[short]', casing_workload, apply_cases))
+        results.append(measure('apply_cases[long]', long_casing_workload, apply_cases))
+
+    await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк горячих путей склонения')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', default=[], help='Префиксы имен замеров')
+    args = parser.parse_args()
+
+    declension_executor.mode = 'inline'
+    for result in asyncio.run(run(args.iterations, args.seed, args.only)):
+        print(result.report())
+
+
+if __name__ == '__main__':
+    main()
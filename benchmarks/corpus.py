@@ -0,0 +1,70 @@
+from models import Case, Gender
+
+
+cases = [Case.gent.name, Case.datv.name, Case.accs.name, Case.ablt.name, Case.loct.name]
+
+fullnames = [
+    "Иванов Иван Иванович",
+    "Петрова Мария Сергеевна",
+    "Сидоров Алексей Николаевич",
+    "Кузнецова Анна Владимировна",
+    "Смирнов Дмитрий Александрович",
+    "Попова Елена Викторовна",
+    "Васильев Андрей Михайлович",
+    "Соколова Ольга Павловна",
+    "Михайлов Сергей Юрьевич",
+    "Новикова Татьяна Игоревна",
+    "Фёдоров Николай Петрович",
+    "Морозова Наталья Андреевна",
+    "Волков Владимир Евгеньевич",
+    "Лебедева Ирина Олеговна",
+    "Полишевский Владимир Владимирович",
+    "Хашковская Влада Владимировна",
+    "Фещенко Юрий Николаевич",
+    "Шишь Алёна Алексеевна",
+    "Гамора Ольга Витальевна",
+    "Злобина Олеся Викторовна",
+    "Шкитин Владимир Александрович",
+    "Охременко Алёна",
+    "Лежнев Дмитрий Михайлович",
+    "Колышкина Анна Евгеньевна",
+    "Зеленкина Яна Николаевна",
+    "Белых Константин Ильич",
+    "Дюма Александр",
+    "Ким Виктор Робертович",
+    "Карпенко Светлана Григорьевна",
+    "Тополиная Ксения Артёмовна",
+]
+
+texts = [
+    "Главный специалист",
+    "Ведущий инженер-программист",
+    "Начальник отдела кадров",
+    "Заместитель начальника управления",
+    "Министерство социального развития",
+    "Сибирский торгово-промышленный банк",
+    "Областное государственное казённое учреждение",
+    "Главный бухгалтер",
+    "Директор департамента информационных технологий",
+    "Старший научный сотрудник лаборатории",
+    "Уральский федеральный университет",
+    "Председатель комитета по образованию",
+    "Консультант отдела правового обеспечения",
+    "Муниципальное автономное общеобразовательное учреждение средняя общеобразовательная школа",
+    "Руководитель проектного офиса",
+]
+
+# Исключения, которые заводятся в тестовой базе: (source_text, case, gender, result)
+exceptions = [
+    ("Дюма Александр", Case.gent.name, None, "Дюма Александра"),
+    ("Белых", Case.datv.name, Gender.masc.name, "Белых"),
+    ("Ким", Case.gent.name, Gender.masc.name, "Кима"),
+    ("ГКУ", Case.gent.name, None, "ГКУ"),
+    ("Главный специалист", Case.datv.name, None, "Главному специалисту"),
+]
+
+# Слова с разным регистром для замеров восстановления регистра на длинных текстах
+casing_words = [
+    "главный", "Специалист", "ООО", "АО", "Министерство", "инженер-программист", "ИТ-отдела",
+    "МакДональдс", "г.", "Екатеринбург", "ПАО", "«Ромашка»", "iPhone", "№12", "отдела", "УФНС",
+]
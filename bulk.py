@@ -0,0 +1,246 @@
+"""
+Пакетное склонение файлов CSV/JSONL без запуска сервера. Запуск из корня репозитория:
+
+    python bulk.py names.csv result.csv --kind person_name --column fullname=ФИО --case gent
+    python bulk.py texts.jsonl result.jsonl --kind text --exceptions exceptions.jsonl --workers 8
+
+Поля записи (fullname или source_text, case, gender, number, system) берутся из одноименных колонок, --column
+задает другое имя колонки, --case/--gender/--number/--system - значение для записей без него.
+Исключения загружаются из базы (--exceptions db), из выгрузки JSONL в формате DeclensionException
+(--exceptions путь) или не используются (--exceptions none). Файл читается и записывается потоково, в выходной файл
+к каждой записи добавляются поля result и error в порядке записей входного файла.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+from collections import deque
+from pathlib import Path
+from typing import Iterator, Optional, Literal
+
+from pydantic import ValidationError
+
+from models import PersonNameDeclension, TextDeclension, BatchResult, DeclensionExceptionUpdate
+from services import DeclensionNameService, DeclensionTextService, DeclensionExceptionsService, morphology
+from services.exceptions_cache import exceptions_cache
+from services.executor import declension_executor
+from settings import settings
+
+
+Kind = Literal['person_name', 'text']
+ExceptionRow = tuple[Optional[str], str, Optional[str], Optional[str], str, str]
+
+models = {'person_name': PersonNameDeclension, 'text': TextDeclension}
+text_fields = {'person_name': 'fullname', 'text': 'source_text'}
+option_fields = ['case', 'gender', 'number', 'system']
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_services: dict = {}
+
+
+def get_format(path: Path, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return 'csv' if path.suffix.lower() == '.csv' else 'jsonl'
+
+
+def read_records(path: Path, fmt: str, delimiter: str) -> Iterator[dict]:
+    if fmt == 'csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.DictReader(f, delimiter=delimiter)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class RecordWriter:
+    def __init__(self, path: Path, fmt: str, delimiter: str):
+        self.file = open(path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8')
+        self.fmt = fmt
+        self.delimiter = delimiter
+        self._csv: Optional[csv.DictWriter] = None
+
+    def write(self, record: dict, result: BatchResult):
+        row = {**record, 'result': result.result, 'error': result.error}
+        if self.fmt == 'jsonl':
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            return
+        if self._csv is None:
+            self._csv = csv.DictWriter(self.file, fieldnames=list(row), delimiter=self.delimiter,
+                                       extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+def read_exceptions_dump(path: Path) -> list[ExceptionRow]:
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                item = DeclensionExceptionUpdate.model_validate_json(line)
+                rows.append((item.system, item.case, item.gender, item.number, item.source_text, item.result))
+    return rows
+
+
+async def read_exceptions_from_db() -> list[ExceptionRow]:
+    from sqlalchemy import select
+    from database import engine, ReadSession
+    from tables import Sentence
+
+    stmt = select(Sentence.system, Sentence.case, Sentence.gender, Sentence.number,
+                  Sentence.source_text, Sentence.result)
+    async with ReadSession() as session:
+        rows = [tuple(row) for row in await session.execute(stmt)]
+    await engine.dispose()
+    return rows
+
+
+def _init_worker(exceptions: list[ExceptionRow]):
+    global _loop
+    settings.exceptions_cache_enabled = True
+    exceptions_cache.ttl = 0
+    exceptions_cache.load(exceptions)
+    declension_executor.mode = 'inline'
+
+    exceptions_service = DeclensionExceptionsService(session_factory=None)
+    _services['person_name'] = DeclensionNameService(exceptions_service).get_inflected_person_names
+    _services['text'] = DeclensionTextService(exceptions_service).get_inflected_texts
+    _loop = asyncio.new_event_loop()
+
+
+def _close_worker():
+    global _loop
+    if _loop is not None:
+        _loop.close()
+        _loop = None
+    _services.clear()
+
+
+def _init_pool_worker(exceptions: list[ExceptionRow]):
+    _init_worker(exceptions)
+    # Выполняется при штатном завершении процесса пула после pool.close() и pool.join()
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def decline_chunk(kind: Kind, payloads: list[dict]) -> list[BatchResult]:
+    results: list[Optional[BatchResult]] = []
+    requests, positions = [], []
+    for payload in payloads:
+        try:
+            requests.append(models[kind].model_validate(payload))
+        except ValidationError as e:
+            results.append(BatchResult(error=f'Некорректная запись: {e.errors(include_url=False)}'))
+            continue
+        positions.append(len(results))
+        results.append(None)
+
+    if requests:
+        for position, result in zip(positions, _loop.run_until_complete(_services[kind](requests))):
+            results[position] = result
+    return results
+
+
+def to_payload(record: dict, kind: Kind, columns: dict[str, str], defaults: dict[str, Optional[str]]) -> dict:
+    payload = {}
+    for field in [text_fields[kind], *option_fields]:
+        value = record.get(columns.get(field, field)) or defaults.get(field)
+        if value is not None:
+            payload[field] = value
+    return payload
+
+
+def iter_chunks(records: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_chunk(writer: RecordWriter, chunk: list[dict], results: list[BatchResult]) -> int:
+    for record, result in zip(chunk, results):
+        writer.write(record, result)
+    return len(chunk)
+
+
+def run(args: argparse.Namespace) -> int:
+    if args.exceptions == 'none':
+        exceptions = []
+    elif args.exceptions == 'db':
+        exceptions = asyncio.run(read_exceptions_from_db())
+    else:
+        exceptions = read_exceptions_dump(Path(args.exceptions))
+
+    columns = dict(item.split('=', 1) for item in args.column)
+    defaults = {field: getattr(args, field) for field in option_fields}
+    records = read_records(args.input, get_format(args.input, args.format), args.delimiter)
+    writer = RecordWriter(args.output, get_format(args.output, args.format), args.delimiter)
+    workers = args.workers or os.cpu_count() or 1
+
+    morphology.preload(freeze=workers > 1)
+    count = 0
+    try:
+        if workers == 1:
+            _init_worker(exceptions)
+            try:
+                for chunk in iter_chunks(records, args.chunk_size):
+                    payloads = [to_payload(record, args.kind, columns, defaults) for record in chunk]
+                    count += write_chunk(writer, chunk, decline_chunk(args.kind, payloads))
+            finally:
+                _close_worker()
+            return count
+
+        # Не больше 2 пакетов на процесс в обработке, чтобы файл не считывался в память целиком
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        with context.Pool(workers, initializer=_init_pool_worker, initargs=(exceptions,)) as pool:
+            pending = deque()
+            for chunk in iter_chunks(records, args.chunk_size):
+                payloads = [to_payload(record, args.kind, columns, defaults) for record in chunk]
+                pending.append((chunk, pool.apply_async(decline_chunk, (args.kind, payloads))))
+                while len(pending) >= workers * 2 or (pending and pending[0][1].ready()):
+                    done_chunk, results = pending.popleft()
+                    count += write_chunk(writer, done_chunk, results.get())
+            while pending:
+                done_chunk, results = pending.popleft()
+                count += write_chunk(writer, done_chunk, results.get())
+            pool.close()
+            pool.join()
+        return count
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетное склонение файлов CSV/JSONL')
+    parser.add_argument('input', type=Path)
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--kind', choices=list(models), default='person_name', help='Склонение ФИО или общих слов')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='По умолчанию определяется по расширению файла')
+    parser.add_argument('--delimiter', default=',', help='Разделитель CSV')
+    parser.add_argument('--column', action='append', default=[], metavar='FIELD=COLUMN',
+                        help='Колонка для поля записи, например fullname=ФИО')
+    for field in option_fields:
+        parser.add_argument(f'--{field}', help=f'Значение {field} для записей без него')
+    parser.add_argument('--exceptions', default='db', help='db, none или путь к выгрузке исключений JSONL')
+    parser.add_argument('--workers', type=int, default=None, help='Число процессов, по умолчанию число ядер')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    count = run(args)
+    print(f'{count} записей -> {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.engine import URL
+from sqlalchemy.engine import URL, Connection
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from settings import settings
@@ -14,15 +18,27 @@ url_object = URL.create(
     database=settings.db_database,
 )
 
-engine = create_async_engine(url_object)
+if url_object.get_driver_name() == 'asyncpg':
+    url_object = url_object.update_query_dict(
+        {'prepared_statement_cache_size': str(settings.db_prepared_statement_cache_size)})
+
+engine = create_async_engine(
+    url_object,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
 
 Session = async_sessionmaker(engine, expire_on_commit=False)
 
+# Для запросов только на чтение: без BEGIN/ROLLBACK вокруг каждого поиска
+ReadSession = async_sessionmaker(engine.execution_options(isolation_level='AUTOCOMMIT'), expire_on_commit=False)
+
 
-async def get_session():
-    session = Session()
-    await session.begin()
-    try:
-        yield session
-    finally:
-        await session.close()
+def run_migrations(connection: Connection):
+    config = Config(str(Path(__file__).parent / 'alembic.ini'))
+    config.attributes['connection'] = connection
+    config.attributes['configure_logger'] = False
+    command.upgrade(config, 'head')
@@ -0,0 +1,39 @@
+"""sentence table
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Базы, созданные до перехода на миграции через Base.metadata.create_all, уже содержат таблицу
+    if sa.inspect(op.get_bind()).has_table('sentence'):
+        return
+    op.create_table(
+        'sentence',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_text', sa.String(), nullable=False),
+        sa.Column('case', sa.String(), nullable=False),
+        sa.Column('number', sa.String(), nullable=True),
+        sa.Column('gender', sa.String(), nullable=True),
+        sa.Column('result', sa.String(), nullable=False),
+        sa.Column('create_datetime', sa.DateTime(), nullable=False),
+        sa.Column('system', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('sentence')
@@ -0,0 +1,38 @@
+"""sentence lookup duplicates
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:10:00.000000
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def upgrade() -> None:
+    # Дубликаты могли появиться через обновление исключений, остается последняя запись.
+    # Уникальный индекс по параметрам склонения создает 0003 по lookup_key: индекс по столбцам с NULL
+    # (NULLS NOT DISTINCT) требует PostgreSQL 15
+    result = op.get_bind().execute(sa.text(
+        'DELETE FROM sentence AS s USING sentence AS d '
+        'WHERE s.id < d.id AND s.source_text = d.source_text AND s."case" = d."case" '
+        'AND s.system IS NOT DISTINCT FROM d.system AND s.gender IS NOT DISTINCT FROM d.gender '
+        'AND s.number IS NOT DISTINCT FROM d.number'
+    ))
+    if result.rowcount:
+        logger.warning('Удалено повторяющихся исключений (остались последние записи): %d', result.rowcount)
+
+
+def downgrade() -> None:
+    pass
@@ -0,0 +1,34 @@
+"""sentence lookup key
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sentence', sa.Column('lookup_key', sa.String(), nullable=True))
+    # Текст json_build_array совпадает с json.dumps(..., ensure_ascii=False) из tables.make_lookup_key
+    op.execute('UPDATE sentence SET lookup_key = json_build_array(system, "case", gender, number)::text')
+    op.alter_column('sentence', 'lookup_key', nullable=False)
+    # Индекс по столбцам параметров, созданный прежней версией 0002 на PostgreSQL 15+
+    op.drop_index('ix_sentence_lookup', table_name='sentence', if_exists=True)
+    op.create_index('ix_sentence_lookup', 'sentence', ['lookup_key', 'source_text'], unique=True)
+    op.create_index('ix_sentence_system', 'sentence', ['system'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sentence_system', table_name='sentence')
+    op.drop_index('ix_sentence_lookup', table_name='sentence')
+    op.drop_column('sentence', 'lookup_key')
@@ -0,0 +1,29 @@
+"""sentence listing indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_sentence_system', table_name='sentence')
+    op.create_index('ix_sentence_system', 'sentence', ['system', 'id'])
+    op.create_index('ix_sentence_source_text', 'sentence', ['source_text'],
+                    postgresql_ops={'source_text': 'text_pattern_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_sentence_source_text', table_name='sentence')
+    op.drop_index('ix_sentence_system', table_name='sentence')
+    op.create_index('ix_sentence_system', 'sentence', ['system'])
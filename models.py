@@ -28,6 +28,7 @@ class Number(Enum):
 
 
 cases = {case.name: case.value for case in Case}
+main_cases = [Case.nomn.name, Case.gent.name, Case.datv.name, Case.accs.name, Case.ablt.name, Case.loct.name]
 genders = {gender.name: gender.value for gender in Gender}
 numbers = {number.name: number.value for number in Number}
 
@@ -40,13 +41,21 @@ class CommonResult(BaseModel):
     result: str = Field(description='Результирующий текст')
 
 
-class Declension(BaseModel):
-    case: Literal[tuple(cases.keys())] = Field(description=f'Падеж. Принимает значения:<br>{display_values(cases)}')
+class BatchResult(BaseModel):
+    result: Optional[str] = Field(default=None, description='Результирующий текст')
+    error: Optional[str] = Field(default=None, description='Описание ошибки склонения')
+
+
+class DeclensionOptions(BaseModel):
     gender: Optional[Literal[tuple(genders.keys())]] = Field(default=None, description=f'Пол Принимает значения:<br>{display_values(genders)}')
     number: Optional[Literal[tuple(numbers.keys())]] = Field(default=Number.sing.name, description=f'Число. Принимает значения:<br>{display_values(numbers)}')
     system: Optional[str] = Field(default=None, description='Наименование системы')
 
 
+class Declension(DeclensionOptions):
+    case: Literal[tuple(cases.keys())] = Field(description=f'Падеж. Принимает значения:<br>{display_values(cases)}')
+
+
 class PersonNameDeclension(Declension):
     fullname: str = Field(min_length=1, description='Текст на склонение')
 
@@ -69,6 +78,31 @@ class TextDeclension(Declension):
     source_text: str = Field(min_length=1, description='Текст на склонение')
 
 
+class Paradigm(DeclensionOptions):
+    cases: Literal['all'] | list[Literal[tuple(case.name for case in Case)]] = Field(
+        default='all', description=f'Список падежей или all - {", ".join(main_cases)}')
+
+    def get_cases(self) -> list[str]:
+        return main_cases if self.cases == 'all' else list(dict.fromkeys(self.cases))
+
+
+class PersonNameParadigm(Paradigm):
+    fullname: str = Field(min_length=1, description='Текст на склонение')
+
+
+class TextParadigm(Paradigm):
+    source_text: str = Field(min_length=1, description='Текст на склонение')
+
+
+class ParadigmResult(BaseModel):
+    results: dict[str, str] = Field(description='Результирующий текст для каждого падежа')
+
+
+class ReadinessResult(BaseModel):
+    ready: bool = Field(description='Сервис готов принимать запросы')
+    morphology_loaded: bool = Field(description='Словари морфологического анализатора загружены')
+
+
 class DeclensionException(TextDeclension):
     id: int = Field(description='Идентификатор исключения')
     result: str = Field(description='Результирующий текст')
@@ -76,9 +110,28 @@ class DeclensionException(TextDeclension):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ExceptionsFilter(BaseModel):
+    system: Optional[str] = Field(default=None, description='Наименование системы')
+    case: Optional[Literal[tuple(cases.keys())]] = Field(default=None, description='Падеж')
+    gender: Optional[Literal[tuple(genders.keys())]] = Field(default=None, description='Пол')
+    number: Optional[Literal[tuple(numbers.keys())]] = Field(default=None, description='Число')
+    source_text_prefix: Optional[str] = Field(default=None, description='Начало текста на склонение')
+
+
+class ExceptionsCount(BaseModel):
+    count: int = Field(description='Количество исключений')
+
+
 class DeclensionExceptionCreate(TextDeclension):
     target_text: str = Field(description='Результирующий текст')
 
 
 class DeclensionExceptionUpdate(TextDeclension):
     result: str = Field(description='Результирующий текст')
+
+
+class ExceptionsImportResult(BaseModel):
+    inserted: int = Field(default=0, description='Добавлено исключений')
+    updated: int = Field(default=0, description='Обновлено исключений')
+    skipped: int = Field(default=0, description='Пропущено записей: повторы в файле и существующие исключения')
+    errors: list[str] = Field(default=[], description='Ошибки в записях, при ошибках исключения не загружаются')
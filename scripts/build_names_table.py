@@ -0,0 +1,30 @@
+"""
+Сборка предрасчитанной таблицы склонений частых имен и отчеств. Запуск из корня репозитория:
+
+    python -m scripts.build_names_table [--vocabulary data/names.txt] [--output data/names_table.json.gz]
+"""
+import argparse
+import gzip
+import io
+import json
+from pathlib import Path
+
+from services.names_table import build, read_vocabulary, vocabulary_path, options_list, root
+from settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сборка таблицы склонений частых имен и отчеств')
+    parser.add_argument('--vocabulary', type=Path, default=vocabulary_path)
+    parser.add_argument('--output', type=Path, default=root / settings.names_table_path)
+    args = parser.parse_args()
+
+    data = build(read_vocabulary(args.vocabulary))
+    # mtime=0 - одинаковый файл при повторной сборке из того же словаря
+    with io.TextIOWrapper(gzip.GzipFile(args.output, 'wb', mtime=0), encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    print(f'{len(data["words"])} слов, {len(options_list)} форм на слово -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
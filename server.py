@@ -0,0 +1,134 @@
+"""
+Запуск сервиса в несколько процессов по модели pre-fork: главный процесс применяет миграции, загружает
+словари морфологии и открывает сокет, после чего запускает воркеры через fork. Словари остаются общими
+для воркеров (copy-on-write), упавшие воркеры перезапускаются с растущей задержкой, по SIGTERM/SIGINT воркеры
+завершаются с ожиданием активных запросов.
+"""
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+from uvicorn.main import STARTUP_FAILURE
+
+from settings import settings
+
+
+logger = logging.getLogger('uvicorn.error')
+
+
+def _migrate():
+    from database import engine, run_migrations
+
+    async def migrate():
+        async with engine.begin() as conn:
+            await conn.run_sync(run_migrations)
+        await engine.dispose()
+
+    asyncio.run(migrate())
+
+
+def _bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ':' in settings.server_host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((settings.server_host, int(settings.server_port)))
+    sock.listen(settings.server_backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket) -> int:
+    """Код завершения воркера: 0 или STARTUP_FAILURE, если приложение не запустилось"""
+    from app import app
+
+    config = uvicorn.Config(
+        app,
+        loop=settings.server_loop,
+        http=settings.server_http,
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keep_alive,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        log_config=None,
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def serve():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:     [%(process)d] %(message)s')
+
+    if settings.db_migrate_on_startup:
+        _migrate()
+        settings.db_migrate_on_startup = False
+
+    from services import morphology
+    import app  # noqa: F401 - импорт приложения до fork, чтобы модули были общими для воркеров
+    if settings.morph_load_mode != 'lazy':
+        morphology.preload(freeze=True)
+
+    sock = _bind_socket()
+    workers_count = settings.server_workers or os.cpu_count() or 1
+    # pid воркера -> время запуска
+    workers: dict[int, float] = {}
+    respawns: list[float] = []
+    failures = 0
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 1
+            try:
+                code = _run_worker(sock)
+            except Exception:
+                logger.exception('Worker failed')
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+        logger.info('Started worker [%d]', pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info('Serving on %s:%s with %d workers', settings.server_host, settings.server_port, workers_count)
+    for _ in range(workers_count):
+        spawn()
+
+    deadline = None
+    while workers or (respawns and not stopping):
+        if stopping and deadline is None:
+            deadline = time.monotonic() + (settings.server_graceful_timeout or 0) + 5
+        if deadline is not None and time.monotonic() > deadline:
+            for pid in workers:
+                os.kill(pid, signal.SIGKILL)
+        while respawns and not stopping and respawns[0] <= time.monotonic():
+            respawns.pop(0)
+            spawn()
+        pid, status = os.waitpid(-1, os.WNOHANG) if workers else (0, 0)
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        started = workers.pop(pid)
+        if not stopping:
+            # Падения считаются подряд, пока воркер не проработает дольше максимальной задержки
+            if time.monotonic() - started > settings.server_respawn_max_delay:
+                failures = 0
+            delay = min(settings.server_respawn_delay * 2 ** failures, settings.server_respawn_max_delay)
+            failures += 1
+            logger.warning('Worker [%d] exited with status %d, restarting in %.1f s',
+                           pid, os.waitstatus_to_exitcode(status), delay)
+            respawns.append(time.monotonic() + delay)
+
+    sock.close()
+    logger.info('Stopped')
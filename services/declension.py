@@ -1,52 +1,40 @@
-from typing import Optional, Iterable, Annotated
+from collections import defaultdict
+from typing import Optional, Callable
 
-import pymorphy3
-from fastapi import Depends
-from nltk.stem import SnowballStemmer
-
-from models import TextDeclension, CommonResult, PersonNameDeclension, Gender
-from settings import settings
+from models import TextDeclension, CommonResult, PersonNameDeclension, Gender, BatchResult, PersonNameParadigm, \
+    TextParadigm, ParadigmResult
 from .declension_exceptions import DeclensionExceptionsService
-from utils.casing_manager import apply_cases
+from .exceptions_cache import get_lookup_key
+from .executor import declension_executor
+from .metrics import timed, count_requests, count_paradigm, stage_duration
+from . import surname_rules
+from .morphology import parse, get_inflected_word
+from utils.casing_manager import apply_cases, apply_word_pattern
+from utils.token_trie import Match
+from utils.tokenizer import Token, tokenize
 
-morph = pymorphy3.MorphAnalyzer(lang='ru')
-vowels = ['у', 'е', 'ы', 'э', 'я', 'и', 'ю', 'ь', 'о']
 female_names = ["влада"]
 
-ExceptionServiceDependency = Annotated[DeclensionExceptionsService, Depends(DeclensionExceptionsService)]
-
-
-class InflectionException(Exception):
-    pass
 
+def inflect_each(func: Callable[..., str], args_list: list[tuple]) -> list[BatchResult]:
+    results = []
+    for args in args_list:
+        try:
+            results.append(BatchResult(result=func(*args)))
+        except Exception as e:
+            results.append(BatchResult(error=f'Ошибка склонения: {e!r}'))
+    return results
 
-def endswith_any(word: str, suffixes: Iterable[str]):
-    return any((word.endswith(suffix) for suffix in suffixes))
 
-
-def get_inflected_word(word: str, options: set[str], raise_on_fail=False, animacy=False) -> Optional[str]:
-    """
-    :param word: слово к преобразованию
-    :param options: параметры преобразования
-    :param raise_on_fail: Выбрасывать исключение при ошибке преобразования слова
-    :param animacy: Подобрать одушевленную форму слова
-    """
-    if None in options:
-        options.remove(None)
-    parsed_words = morph.parse(word)
-    if animacy:
-        word = next(filter(lambda p: {'NOUN', 'anim', 'nomn'}.issubset(p.tag.grammemes), parsed_words), parsed_words[0])
-    else:
-        word = parsed_words[0]
-    inflected_word = word.inflect(options)
-    if not inflected_word and raise_on_fail:
-        raise InflectionException()
-    return inflected_word.word if inflected_word else word.word
+def inflect_all(func: Callable[..., str], args_list: list[tuple]) -> list[str]:
+    return [func(*args) for args in args_list]
 
 
 class DeclensionNameService:
-    def __init__(self, db: ExceptionServiceDependency):
-        self.snowball = SnowballStemmer(language="russian")
+    # Окончания шаблонного слова по (падеж, пол, число) для склонения фамилий
+    template_endings = surname_rules.template_endings
+
+    def __init__(self, db: DeclensionExceptionsService):
         self.db = db
 
     @staticmethod
@@ -57,10 +45,11 @@ class DeclensionNameService:
 
     @staticmethod
     def _get_gender_by_name(name: str) -> str:
-        _name_parse_obj = morph.parse(name)[0]
+        _name_parse_obj = parse(name)[0]
         if _name_parse_obj.word.lower() in female_names:
             return Gender.femn.name
-        return _name_parse_obj.tag.gender
+        gender = _name_parse_obj.tag.gender
+        return str(gender) if gender else None
 
     def try_recognize_gender(self, patronymic, name):
         gender = Gender.femn.name
@@ -70,44 +59,119 @@ class DeclensionNameService:
             gender = self._get_gender_by_name(name)
         return gender
 
+    @timed('person_name')
     async def get_inflected_person_name(self, request: PersonNameDeclension):
-        sentence = await self.db.get_single_result_from_db(request.fullname, request)
-        if sentence:
-            return CommonResult(result=sentence.result)
+        count_requests('person_name', [request])
+        result = await self.db.get_single_result(request.fullname, request)
+        if result:
+            return CommonResult(result=result)
 
         surname, name, patronymic = self._get_separated_name(request.fullname)
         if not request.gender:
             request.gender = self.try_recognize_gender(patronymic, name)
-        options = {request.case, request.gender, request.number}
-        results_words = []
 
-        exceptions = await self.db.get_many_results_from_db([surname, name, patronymic], request)
+        exceptions = await self.db.get_many_results([surname, name, patronymic], request)
 
-        if name and surname:
-            name = exceptions.get(name) if exceptions.get(name) else get_inflected_word(name, options, animacy=True)
-
-            common_name = settings.male_common_name if request.gender == Gender.masc.name else settings.female_common_name
-            template_word = get_inflected_word(common_name, options, animacy=True)
+        result = await declension_executor.run(
+            len(request.fullname), self.inflect_person_name,
+            surname, name, patronymic, (request.case, request.gender, request.number), exceptions, request.system
+        )
+        return CommonResult(result=result)
 
+    @timed('person_name_batch')
+    async def get_inflected_person_names(self, requests: list[PersonNameDeclension]) -> list[BatchResult]:
+        count_requests('person_name', requests)
+        unique_requests: dict[tuple, PersonNameDeclension] = {}
+        for request in requests:
+            unique_requests.setdefault(
+                (request.fullname, request.case, request.gender, request.number, request.system), request)
+
+        lookups = defaultdict(set)
+        prepared = {}
+        for request_key, request in unique_requests.items():
+            lookups[get_lookup_key(request)].add(request.fullname)
             try:
-                inflected_surname = get_inflected_word(surname, options, raise_on_fail=True, animacy=True)
-            except InflectionException:
-                inflected_surname = None
-
-            if exceptions.get(surname):
-                surname = exceptions.get(surname)
-            elif endswith_any(surname, ['ов', 'ев', 'ева', 'ина']):
-                surname = self._get_ova_eva_case(surname, request.gender, template_word)
-            elif surname.endswith("ая"):
-                surname = self._get_femn_aya_case(surname, template_word)
-            elif surname.endswith("ора") and inflected_surname:
-                surname = inflected_surname
-            elif surname[-1] in vowels:
-                surname = surname.lower()
-            elif inflected_surname:
-                surname = inflected_surname
+                surname, name, patronymic = self._get_separated_name(request.fullname)
+                gender = request.gender or self.try_recognize_gender(patronymic, name)
+            except Exception as e:
+                prepared[request_key] = BatchResult(error=f'Ошибка склонения: {e!r}')
+                continue
+            parts_key = (request.system, request.case, gender, request.number)
+            lookups[parts_key].update(part for part in (surname, name, patronymic) if part)
+            prepared[request_key] = (surname, name, patronymic, parts_key)
+
+        exceptions = await self.db.get_grouped_results(lookups)
+
+        pending_keys, args_list = [], []
+        for request_key, request in unique_requests.items():
+            result = exceptions[get_lookup_key(request)].get(request.fullname)
+            if result:
+                prepared[request_key] = BatchResult(result=result)
+            elif isinstance(prepared[request_key], tuple):
+                surname, name, patronymic, parts_key = prepared[request_key]
+                _, case, gender, number = parts_key
+                pending_keys.append(request_key)
+                args_list.append((surname, name, patronymic, (case, gender, number), exceptions[parts_key],
+                                  request.system))
+
+        size = sum(len(args[0]) for args in args_list)
+        results = await declension_executor.run(size, inflect_each, self.inflect_person_name, args_list)
+        prepared.update(zip(pending_keys, results))
+
+        return [prepared[(r.fullname, r.case, r.gender, r.number, r.system)] for r in requests]
+
+    @timed('person_name_paradigm')
+    async def get_person_name_paradigm(self, request: PersonNameParadigm) -> ParadigmResult:
+        requested_cases = request.get_cases()
+        count_paradigm('person_name', request, requested_cases)
+        surname, name, patronymic = self._get_separated_name(request.fullname)
+        gender = request.gender or self.try_recognize_gender(patronymic, name)
+        parts = {part for part in (surname, name, patronymic) if part}
+
+        lookups = defaultdict(set)
+        for case in requested_cases:
+            lookups[(request.system, case, request.gender, request.number)].add(request.fullname)
+            lookups[(request.system, case, gender, request.number)].update(parts)
+        exceptions = await self.db.get_grouped_results(lookups)
+
+        results = {}
+        pending_cases, args_list = [], []
+        for case in requested_cases:
+            result = exceptions[(request.system, case, request.gender, request.number)].get(request.fullname)
+            if result:
+                results[case] = result
             else:
-                surname = self._get_rest_cases_surname(surname, template_word)
+                pending_cases.append(case)
+                args_list.append((surname, name, patronymic, (case, gender, request.number),
+                                  exceptions[(request.system, case, gender, request.number)], request.system))
+
+        size = len(request.fullname) * len(args_list)
+        results.update(zip(pending_cases, await declension_executor.run(
+            size, inflect_all, self.inflect_person_name, args_list)))
+        return ParadigmResult(results={case: results[case] for case in requested_cases})
+
+    @classmethod
+    def inflect_person_name(cls, surname: str, name: Optional[str], patronymic: Optional[str],
+                            options: tuple[Optional[str], ...], exceptions: dict[str, str],
+                            system: Optional[str] = None) -> str:
+        """
+        Склонение разделенного ФИО без обращения к базе, пригодно для выполнения в отдельном процессе
+        :param options: падеж, пол, число
+        :param exceptions: исключения для частей ФИО
+        :param system: система, правила склонения фамилий которой применяются
+        """
+        gender = options[1]
+        results_words = []
+
+        if name and surname:
+            name = exceptions.get(name) if exceptions.get(name) else get_inflected_word(name, options, animacy=True)
+
+            with stage_duration.time('surname'):
+                if exceptions.get(surname):
+                    surname = exceptions.get(surname)
+                else:
+                    ending = cls.template_endings.get(options)
+                    surname = surname_rules.get_rules(system).decline(surname, options, ending)
 
             results_words = [surname, name]
 
@@ -120,29 +184,7 @@ class DeclensionNameService:
             surname = get_inflected_word(surname, options, animacy=True)
             results_words = [surname]
 
-        result = " ".join([x.capitalize() for x in results_words])
-        return CommonResult(result=result)
-
-    def _get_ova_eva_case(self, surname: str, gender: str, template_word: str):
-        stem_form = self.snowball.stem(template_word)
-        ending = template_word[len(stem_form):]
-        if gender == Gender.masc.name:
-            inflected_surname = surname + ending
-        else:
-            inflected_surname = surname[:-1] + ending
-        return inflected_surname
-
-    def _get_femn_aya_case(self, surname: str, template_word: str):
-        stem_form = self.snowball.stem(template_word)
-        ending = template_word[len(stem_form):]
-        inflected_surname = surname[:-2] + ending
-        return inflected_surname
-
-    def _get_rest_cases_surname(self, surname: str, template_word: str) -> str:
-        stem_form = self.snowball.stem(template_word)
-        ending = template_word[len(stem_form):]
-        inflected_surname = self.snowball.stem(surname) + ending
-        return inflected_surname
+        return " ".join([x.capitalize() for x in results_words])
 
     @staticmethod
     def _get_separated_name(fullname: str):
@@ -159,26 +201,134 @@ class DeclensionNameService:
 
 
 class DeclensionTextService:
-    def __init__(self, db: ExceptionServiceDependency):
+    def __init__(self, db: DeclensionExceptionsService):
         self.db = db
 
+    @timed('text')
     async def get_inflected_text(self, request: TextDeclension) -> CommonResult:
-        sentence = await self.db.get_single_result_from_db(request.source_text, request)
-        if sentence:
-            return CommonResult(result=sentence.result)
+        count_requests('text', [request])
+        key = get_lookup_key(request)
+        exceptions = (await self.db.get_text_exceptions({key: {request.source_text}}))[key]
+        result = exceptions.get(request.source_text)
+        if result:
+            return CommonResult(result=result)
+
+        tokens, words = self._tokenize(request.source_text)
+        result = await declension_executor.run(
+            len(request.source_text), self.inflect_text, request.source_text, tokens,
+            (request.case, request.gender, request.number), exceptions.find(words)
+        )
+        return CommonResult(result=result)
 
-        words = request.source_text.split()
-        exceptions = await self.db.get_many_results_from_db(words, request)
-        options = {request.case, request.gender, request.number}
+    @timed('text_batch')
+    async def get_inflected_texts(self, requests: list[TextDeclension]) -> list[BatchResult]:
+        count_requests('text', requests)
+        unique_requests: dict[tuple, TextDeclension] = {}
+        for request in requests:
+            unique_requests.setdefault(
+                (request.source_text, request.case, request.gender, request.number, request.system), request)
+
+        lookups = defaultdict(set)
+        for request in unique_requests.values():
+            lookups[get_lookup_key(request)].add(request.source_text)
+
+        exceptions = await self.db.get_text_exceptions(lookups)
+
+        prepared = {}
+        pending_keys, args_list = [], []
+        for request_key, request in unique_requests.items():
+            key_exceptions = exceptions[get_lookup_key(request)]
+            result = key_exceptions.get(request.source_text)
+            if result:
+                prepared[request_key] = BatchResult(result=result)
+            else:
+                tokens, words = self._tokenize(request.source_text)
+                pending_keys.append(request_key)
+                args_list.append((request.source_text, tokens, (request.case, request.gender, request.number),
+                                  key_exceptions.find(words)))
+
+        size = sum(len(request_key[0]) for request_key in pending_keys)
+        results = await declension_executor.run(size, inflect_each, self.inflect_text, args_list)
+        prepared.update(zip(pending_keys, results))
+
+        return [prepared[(r.source_text, r.case, r.gender, r.number, r.system)] for r in requests]
+
+    @timed('text_paradigm')
+    async def get_text_paradigm(self, request: TextParadigm) -> ParadigmResult:
+        requested_cases = request.get_cases()
+        count_paradigm('text', request, requested_cases)
+        tokens, words = self._tokenize(request.source_text)
+
+        lookups = {(request.system, case, request.gender, request.number): {request.source_text}
+                   for case in requested_cases}
+        exceptions = await self.db.get_text_exceptions(lookups)
+
+        results = {}
+        pending_cases, args_list = [], []
+        for case in requested_cases:
+            key_exceptions = exceptions[(request.system, case, request.gender, request.number)]
+            result = key_exceptions.get(request.source_text)
+            if result:
+                results[case] = result
+            else:
+                pending_cases.append(case)
+                args_list.append((request.source_text, tokens, (case, request.gender, request.number),
+                                  key_exceptions.find(words)))
 
-        inflected_words = []
+        size = len(request.source_text) * len(args_list)
+        results.update(zip(pending_cases, await declension_executor.run(
+            size, inflect_all, self.inflect_text, args_list)))
+        return ParadigmResult(results={case: results[case] for case in requested_cases})
 
-        for word in words:
-            if word in exceptions.keys():
-                inflected_words.append(exceptions[word].result)
-            else:
-                inflected = get_inflected_word(word, options)
-                inflected_words.append(inflected)
+    @staticmethod
+    def _tokenize(source_text: str) -> tuple[list[Token], list[str]]:
+        """Слова текста и слова без знаков препинания для поиска вхождений исключений"""
+        tokens = tokenize(source_text)
+        return tokens, [token.core for token in tokens]
 
-        target_text = ' '.join(inflected_words)
-        return CommonResult(result=apply_cases(request.source_text, target_text))
+    @staticmethod
+    def inflect_text(source_text: str, tokens: list[Token], options: tuple[Optional[str], ...],
+                     matches: list[Match]) -> str:
+        """
+        Склонение текста без обращения к базе, пригодно для выполнения в отдельном процессе.
+        Пробельные символы и знаки препинания по краям слов сохраняются, слова в кавычках не склоняются,
+        повторяющиеся слова склоняются один раз
+        :param tokens: слова текста
+        :param options: падеж, пол, число
+        :param matches: вхождения исключений в текст, регистр переносится на них так же, как на склоненные слова
+        """
+        # Участки текста из склоняемых слов между вхождениями исключений: (первое слово, слово после последнего)
+        segments = []
+        position = 0
+        for start, end, _ in matches:
+            segments.append((position, start))
+            position = end
+        segments.append((position, len(tokens)))
+
+        cores = {token.core for first, last in segments for token in tokens[first:last]
+                 if token.core and not token.quoted}
+        forms = {core: get_inflected_word(core, options) for core in cores}
+
+        with stage_duration.time('casing'):
+            parts = []
+            offset = 0
+            for (first, last), match in zip(segments, [*matches, None]):
+                for token in tokens[first:last]:
+                    parts.append(source_text[offset:token.start])
+                    parts.append(token.prefix)
+                    if token.quoted:
+                        parts.append(token.core)
+                    elif token.core:
+                        parts.append(apply_word_pattern(forms[token.core], token.pattern))
+                    parts.append(token.suffix)
+                    offset = token.end
+                if match is not None:
+                    start, end, result = match
+                    # Знаки препинания перед первым и после последнего слова вхождения сохраняются
+                    parts.append(source_text[offset:tokens[start].start])
+                    parts.append(tokens[start].prefix)
+                    parts.append(apply_cases(' '.join(token.core for token in tokens[start:end]), result))
+                    parts.append(tokens[end - 1].suffix)
+                    offset = tokens[end - 1].end
+            parts.append(source_text[offset:])
+            return ''.join(parts)
@@ -1,21 +1,39 @@
-from typing import Optional, Iterable
+from typing import Optional, Iterable, AsyncIterator
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import select, ColumnElement
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, status
+from sqlalchemy import select, ColumnElement, tuple_, any_, bindparam, String, literal_column, func
+from sqlalchemy.dialects.postgresql import insert, ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from models import DeclensionExceptionCreate, Declension, DeclensionExceptionUpdate
-from tables import Sentence
-from database import get_session
+from models import DeclensionExceptionCreate, Declension, DeclensionExceptionUpdate, ExceptionsImportResult, \
+    ExceptionsFilter
+from tables import Sentence, ExceptionsVersion, make_lookup_key
+from settings import settings
+from .exceptions_cache import exceptions_cache, get_lookup_key, LookupKey, TextExceptions, make_trie
+from .exceptions_notifications import make_change, notify
+from .metrics import stage_duration
+from utils.tokenizer import get_cores
+
+
+lookup_index_elements = [Sentence.lookup_key, Sentence.source_text]
 
 
 class DeclensionExceptionsService:
-    def __init__(self, session: AsyncSession = Depends(get_session)):
-        self.session = session
+    def __init__(self, session_factory: Optional[async_sessionmaker[AsyncSession]],
+                 read_session_factory: Optional[async_sessionmaker[AsyncSession]] = None):
+        """
+        :param session_factory: сессии для изменения исключений, None - без базы: исключения берутся только
+            из загруженного индекса в памяти, который не перечитывается
+        :param read_session_factory: сессии для запросов только на чтение, например в режиме AUTOCOMMIT
+        """
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory or session_factory
 
-    async def _get_exception(self, exception_id: int) -> Sentence:
+    @staticmethod
+    async def _get_exception(session: AsyncSession, exception_id: int) -> Sentence:
         stmt = select(Sentence).where(Sentence.id == exception_id)
-        entity = (await self.session.execute(stmt)).scalar()
+        entity = (await session.execute(stmt)).scalar()
         if not entity:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
         return entity
@@ -23,59 +41,299 @@ class DeclensionExceptionsService:
     async def create_exception(self, request: DeclensionExceptionCreate) -> Sentence:
         model = request.model_dump()
         result = model.pop('target_text')
-        create_model = model.copy()
-        create_model['result'] = result
-        sentence = (await self.session.execute(select(Sentence).filter_by(**model))).first()
-        if sentence:
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT)
-        sentence = Sentence(**create_model)
-        self.session.add(sentence)
-        await self.session.commit()
+        statement = (
+            insert(Sentence)
+            .values(**model, result=result, lookup_key=make_lookup_key(*get_lookup_key(request)))
+            .on_conflict_do_nothing(index_elements=lookup_index_elements)
+            .returning(Sentence)
+        )
+        async with self.session_factory() as session:
+            sentence = (await session.execute(statement)).scalar()
+            if not sentence:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT)
+            version = await self._bump_version(session, added=[sentence])
+            await session.commit()
+        exceptions_cache.add(sentence)
+        exceptions_cache.set_version(version)
         return sentence
 
     async def update_exception(self, exception_id: int, request: DeclensionExceptionUpdate) -> Sentence:
-        entity = await self._get_exception(exception_id)
-        for field, value in request:
-            setattr(entity, field, value)
-        await self.session.commit()
+        async with self.session_factory() as session:
+            entity = await self._get_exception(session, exception_id)
+            old_key, old_text = get_lookup_key(entity), entity.source_text
+            for field, value in request:
+                setattr(entity, field, value)
+            entity.lookup_key = make_lookup_key(*get_lookup_key(entity))
+            try:
+                version = await self._bump_version(session, added=[entity], removed=[(old_key, old_text)])
+                await session.commit()
+            except IntegrityError:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT)
+        exceptions_cache.remove(old_key, old_text)
+        exceptions_cache.add(entity)
+        exceptions_cache.set_version(version)
         return entity
 
     async def delete_exception(self, exception_id: int):
-        entity = await self._get_exception(exception_id)
-        await self.session.delete(entity)
-        await self.session.commit()
+        async with self.session_factory() as session:
+            entity = await self._get_exception(session, exception_id)
+            await session.delete(entity)
+            version = await self._bump_version(session, added=[],
+                                               removed=[(get_lookup_key(entity), entity.source_text)])
+            await session.commit()
+        exceptions_cache.remove(get_lookup_key(entity), entity.source_text)
+        exceptions_cache.set_version(version)
 
-    async def list_all_exceptions(self) -> list[Sentence]:
-        stmt = select(Sentence)
-        sentences = await self.session.execute(stmt)
-        return list(sentences.scalars())
+    @staticmethod
+    async def _bump_version(session: AsyncSession, added: Optional[Iterable[Sentence]] = None,
+                            removed: Iterable[tuple[LookupKey, str]] = ()) -> int:
+        """
+        Увеличение версии набора исключений и уведомление других процессов в транзакции изменения.
+        Без added процессы перечитают исключения целиком
+        """
+        statement = (
+            insert(ExceptionsVersion)
+            .values(id=1, version=1)
+            .on_conflict_do_update(index_elements=[ExceptionsVersion.id],
+                                   set_={'version': ExceptionsVersion.version + 1})
+            .returning(ExceptionsVersion.version)
+        )
+        version = (await session.execute(statement)).scalar()
+        await notify(session, {'version': version} if added is None else make_change(version, added, removed))
+        return version
+
+    async def get_version(self) -> Optional[int]:
+        """
+        Версия набора исключений, по которому склоняются запросы. Без индекса в памяти - None,
+        чтобы не читать версию из базы при каждом склонении
+        """
+        if not settings.exceptions_cache_enabled:
+            return None
+        await self._ensure_cache_fresh()
+        return exceptions_cache.version
+
+    @staticmethod
+    def _deduplicate(records: list[DeclensionExceptionUpdate]) -> list[dict]:
+        # Одна строка на ключ, иначе ON CONFLICT DO UPDATE не выполнится. Побеждает последняя запись
+        rows = {}
+        for record in records:
+            lookup_key = make_lookup_key(*get_lookup_key(record))
+            rows[(lookup_key, record.source_text)] = {**record.model_dump(), 'lookup_key': lookup_key}
+        return list(rows.values())
 
-    async def list_exceptions_within_system(self, system: str) -> list[Sentence]:
-        stmt = select(Sentence).where(Sentence.system == system)
-        sentences = await self.session.execute(stmt)
-        return list(sentences.scalars())
+    async def _upsert(self, session: AsyncSession, records: list[DeclensionExceptionUpdate], overwrite: bool,
+                      import_result: ExceptionsImportResult):
+        rows = self._deduplicate(records)
+        statement = insert(Sentence).values(rows)
+        if overwrite:
+            statement = statement.on_conflict_do_update(
+                index_elements=lookup_index_elements, set_={'result': statement.excluded.result})
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=lookup_index_elements)
+        # xmax = 0 только у вставленных строк, у обновленных - идентификатор обновившей транзакции
+        inserted = list((await session.execute(statement.returning(literal_column('xmax = 0')))).scalars())
+        import_result.inserted += sum(inserted)
+        import_result.updated += len(inserted) - sum(inserted)
+        import_result.skipped += len(records) - len(inserted)
+
+    async def import_exceptions(self, records: AsyncIterator[tuple[int, DeclensionExceptionUpdate | str]],
+                                overwrite: bool, batch_size: int) -> ExceptionsImportResult:
+        """
+        Загрузка исключений многострочными INSERT ... ON CONFLICT по batch_size записей в одной транзакции.
+        При ошибках в записях исключения не загружаются
+        :param overwrite: Заменять результат существующих исключений, иначе такие записи пропускаются
+        """
+        import_result = ExceptionsImportResult()
+        batch = []
+        async with self.session_factory() as session:
+            async for number, record in records:
+                if isinstance(record, str):
+                    import_result.errors.append(record)
+                    if len(import_result.errors) >= 100:
+                        break
+                    continue
+                if import_result.errors:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    await self._upsert(session, batch, overwrite, import_result)
+                    batch = []
+            if import_result.errors:
+                await session.rollback()
+                import_result.inserted = import_result.updated = import_result.skipped = 0
+                return import_result
+            if batch:
+                await self._upsert(session, batch, overwrite, import_result)
+            if import_result.inserted or import_result.updated:
+                await self._bump_version(session)
+            await session.commit()
+        exceptions_cache.invalidate()
+        return import_result
+
+    async def export_exceptions(self, system: Optional[str], page_size: int) -> AsyncIterator[list[Sentence]]:
+        """Выгрузка исключений страницами по page_size строк, каждая страница - отдельный запрос по id"""
+        last_id = 0
+        while True:
+            statement = select(Sentence).where(Sentence.id > last_id).order_by(Sentence.id).limit(page_size)
+            if system is not None:
+                statement = statement.where(Sentence.system == system)
+            async with self.read_session_factory() as session:
+                page = list((await session.execute(statement)).scalars())
+            if not page:
+                return
+            yield page
+            last_id = page[-1].id
+
+    async def list_exceptions(self, filters: ExceptionsFilter, after_id: Optional[int], limit: int) -> list[Sentence]:
+        """
+        Страница исключений по возрастанию id
+        :param after_id: id последнего исключения предыдущей страницы
+        """
+        stmt = select(Sentence).where(*self.construct_filter_clauses(filters)).order_by(Sentence.id).limit(limit)
+        if after_id is not None:
+            stmt = stmt.where(Sentence.id > after_id)
+        async with self.read_session_factory() as session:
+            sentences = await session.execute(stmt)
+            return list(sentences.scalars())
+
+    async def count_exceptions(self, filters: ExceptionsFilter) -> int:
+        stmt = select(func.count()).select_from(Sentence).where(*self.construct_filter_clauses(filters))
+        async with self.read_session_factory() as session:
+            return (await session.execute(stmt)).scalar()
 
     async def list_systems(self) -> list[str]:
         stmt = select(Sentence.system).distinct()
-        systems = await self.session.execute(stmt)
-        return [s for s in systems.scalars() if s is not None]
+        async with self.read_session_factory() as session:
+            systems = await session.execute(stmt)
+            return [s for s in systems.scalars() if s is not None]
 
     async def get_single_result_from_db(self, text: str, request: Declension) -> Optional[Sentence]:
         clauses = self.construct_where_clauses(request)
         statement = select(Sentence).where(Sentence.source_text == text).where(*clauses)
-        result = await self.session.execute(statement)
-        return result.scalar()
+        async with self.read_session_factory() as session:
+            result = await session.execute(statement)
+            return result.scalar()
 
     async def get_many_results_from_db(self, words: Iterable[str], request: Declension) -> dict[str, Sentence]:
         clauses = self.construct_where_clauses(request)
-        statement = select(Sentence).where(Sentence.source_text.in_(words)).where(*clauses)
-        result = await self.session.execute(statement)
-        return {sentence.source_text: sentence for sentence in result.scalars()}
+        async with self.read_session_factory() as session:
+            statement = select(Sentence).where(self._source_text_in(session, words)).where(*clauses)
+            result = await session.execute(statement)
+            return {sentence.source_text: sentence for sentence in result.scalars()}
+
+    async def get_grouped_results_from_db(self, lookups: dict[LookupKey, set[str]]) -> dict[LookupKey, dict[str, str]]:
+        results = {key: {} for key in lookups}
+        pairs = [(make_lookup_key(*key), text) for key, texts in lookups.items() for text in texts]
+        if not pairs:
+            return results
+        chunk_size = settings.exceptions_lookup_chunk_size
+        async with self.read_session_factory() as session:
+            for start in range(0, len(pairs), chunk_size):
+                statement = select(Sentence).where(self._lookup_pairs_in(session, pairs[start:start + chunk_size]))
+                for sentence in (await session.execute(statement)).scalars():
+                    results[get_lookup_key(sentence)][sentence.source_text] = sentence.result
+        return results
+
+    async def _ensure_cache_fresh(self):
+        if exceptions_cache.is_stale:
+            if self.read_session_factory is None:
+                raise RuntimeError('Индекс исключений не загружен или устарел, а база для его загрузки не задана')
+            async with self.read_session_factory() as session:
+                await exceptions_cache.refresh(session)
+
+    async def get_single_result(self, text: str, request: Declension) -> Optional[str]:
+        with stage_duration.time('exception_lookup'):
+            if settings.exceptions_cache_enabled:
+                await self._ensure_cache_fresh()
+                return exceptions_cache.get(text, get_lookup_key(request))
+            sentence = await self.get_single_result_from_db(text, request)
+            return sentence.result if sentence else None
+
+    async def get_many_results(self, words: Iterable[str], request: Declension) -> dict[str, str]:
+        with stage_duration.time('exception_lookup'):
+            if settings.exceptions_cache_enabled:
+                await self._ensure_cache_fresh()
+                return exceptions_cache.get_many(words, get_lookup_key(request))
+            sentences = await self.get_many_results_from_db(words, request)
+            return {text: sentence.result for text, sentence in sentences.items()}
+
+    async def get_grouped_results(self, lookups: dict[LookupKey, set[str]]) -> dict[LookupKey, dict[str, str]]:
+        """
+        Исключения для нескольких наборов параметров склонения одним запросом
+        :param lookups: (system, case, gender, number) -> тексты для поиска
+        """
+        with stage_duration.time('exception_lookup'):
+            if settings.exceptions_cache_enabled:
+                await self._ensure_cache_fresh()
+                return {key: exceptions_cache.get_many(texts, key) for key, texts in lookups.items()}
+            return await self.get_grouped_results_from_db(lookups)
+
+    async def get_text_exceptions(self, lookups: dict[LookupKey, set[str]]) -> dict[LookupKey, TextExceptions]:
+        """
+        Исключения для склонения текстов: по тексту целиком и для поиска вхождений многословных исключений.
+        Вхождения ищутся среди исключений до exceptions_max_words слов как в индексе в памяти, так и без него -
+        тогда из базы запрашиваются тексты и их фрагменты такой длины (не больше exceptions_max_fragments на текст)
+        :param lookups: (system, case, gender, number) -> тексты
+        """
+        with stage_duration.time('exception_lookup'):
+            if settings.exceptions_cache_enabled:
+                await self._ensure_cache_fresh()
+                return {key: exceptions_cache.get_text_exceptions(key) for key in lookups}
+            candidates = {key: {fragment for text in texts for fragment in self._text_fragments(text)}
+                          for key, texts in lookups.items()}
+            results = await self.get_grouped_results_from_db(candidates)
+            return {key: TextExceptions(key_results, make_trie(key_results.items()))
+                    for key, key_results in results.items()}
 
     @staticmethod
-    def construct_where_clauses(request: Declension) -> list[ColumnElement[bool]]:
-        clauses = [Sentence.system == request.system,
-                   Sentence.gender == request.gender,
-                   Sentence.number == request.number,
-                   Sentence.case == request.case]
+    def _text_fragments(text: str) -> list[str]:
+        """
+        Текст и его фрагменты до exceptions_max_words слов, от коротких к длинным, всего не больше
+        exceptions_max_fragments: в очень длинном тексте длинные вхождения ищутся не по всему тексту
+        """
+        fragments = dict.fromkeys([text])
+        # Исключения могут быть записаны как со знаками препинания по краям слов, так и без них
+        words, cores = text.split(), get_cores(text)
+        for length in range(1, settings.exceptions_max_words + 1):
+            for start in range(len(words) - length + 1):
+                for fragment in (words[start:start + length], cores[start:start + length]):
+                    if len(fragments) >= settings.exceptions_max_fragments:
+                        return list(fragments)
+                    fragments[' '.join(fragment)] = None
+        return list(fragments)
+
+    @staticmethod
+    def _source_text_in(session: AsyncSession, texts: Iterable[str]) -> ColumnElement[bool]:
+        # В PostgreSQL массив вместо IN (...) дает один текст запроса при любом числе слов,
+        # поэтому подготовленный asyncpg запрос переиспользуется
+        if session.bind.dialect.name == 'postgresql':
+            return Sentence.source_text == any_(bindparam('source_texts', list(texts), type_=ARRAY(String)))
+        return Sentence.source_text.in_(texts)
+
+    @staticmethod
+    def _lookup_pairs_in(session: AsyncSession, pairs: list[tuple[str, str]]) -> ColumnElement[bool]:
+        # Пары передаются двумя массивами: число параметров и текст запроса не зависят от числа пар
+        lookup = tuple_(Sentence.lookup_key, Sentence.source_text)
+        if session.bind.dialect.name == 'postgresql':
+            keys, texts = zip(*pairs)
+            table = func.unnest(bindparam('lookup_keys', list(keys), type_=ARRAY(String)),
+                                bindparam('source_texts', list(texts), type_=ARRAY(String))) \
+                .table_valued('lookup_key', 'source_text').render_derived()
+            return lookup.in_(select(table.c.lookup_key, table.c.source_text))
+        return lookup.in_(pairs)
+
+    @staticmethod
+    def construct_filter_clauses(filters: ExceptionsFilter) -> list[ColumnElement[bool]]:
+        clauses = [getattr(Sentence, field) == getattr(filters, field)
+                   for field in ('system', 'case', 'gender', 'number') if getattr(filters, field) is not None]
+        if filters.source_text_prefix:
+            clauses.append(Sentence.source_text.startswith(filters.source_text_prefix, autoescape=True))
         return clauses
+
+    @classmethod
+    def construct_where_clauses(cls, request: Declension) -> list[ColumnElement[bool]]:
+        return cls.construct_key_clauses(get_lookup_key(request))
+
+    @staticmethod
+    def construct_key_clauses(key: LookupKey) -> list[ColumnElement[bool]]:
+        return [Sentence.lookup_key == make_lookup_key(*key)]
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from typing import Optional, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Declension
+from settings import settings
+from tables import Sentence, ExceptionsVersion
+from utils.token_trie import TokenTrie, Match
+
+
+LookupKey = tuple[Optional[str], str, Optional[str], Optional[str]]
+
+
+def get_lookup_key(request: Declension | Sentence) -> LookupKey:
+    return request.system, request.case, request.gender, request.number
+
+
+class TextExceptions:
+    """
+    Исключения одного набора параметров склонения: по тексту целиком и для поиска вхождений в текст.
+    Обращения к индексу в памяти учитываются в его статистике попаданий
+    """
+    def __init__(self, results: dict[str, str], trie: TokenTrie, cache: Optional['ExceptionsCache'] = None):
+        self.results = results
+        self.trie = trie
+        self.cache = cache
+
+    def get(self, text: str) -> Optional[str]:
+        result = self.results.get(text)
+        if self.cache is not None:
+            self.cache.lookups += 1
+            self.cache.hits += result is not None
+        return result
+
+    def find(self, words: list[str]) -> list[Match]:
+        matches = self.trie.find(words)
+        if self.cache is not None:
+            self.cache.lookups += len(words)
+            self.cache.hits += len(matches)
+        return matches
+
+
+def make_trie(items: Iterable[tuple[str, str]]) -> TokenTrie:
+    """Дерево для поиска вхождений исключений длиной не больше exceptions_max_words слов"""
+    return TokenTrie(items, max_words=settings.exceptions_max_words)
+
+
+empty_trie = TokenTrie()
+
+
+class ExceptionsCache:
+    """
+    Индекс исключений в памяти процесса: (system, case, gender, number) -> {source_text: result}.
+    Перечитывается из базы целиком по истечении ttl секунд (0 - без перечитывания).
+    Деревья для поиска вхождений исключений в текст строятся при первом обращении к набору параметров.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._index: dict[LookupKey, dict[str, str]] = {}
+        self._tries: dict[LookupKey, TokenTrie] = {}
+        self._loaded_at: Optional[float] = None
+        # Версия набора исключений, из которого построен индекс
+        self.version = 0
+        self._lock = asyncio.Lock()
+        # Изменения, пришедшие во время чтения индекса из базы: применяются к прочитанному индексу
+        self._pending: Optional[list[dict]] = None
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl
+
+    async def refresh(self, session: AsyncSession, force: bool = False):
+        async with self._lock:
+            if not force and not self.is_stale:
+                return
+            self._pending = []
+            try:
+                # Версия читается тем же запросом, что и исключения, чтобы соответствовать им
+                version = select(ExceptionsVersion.version).where(ExceptionsVersion.id == 1).scalar_subquery()
+                stmt = select(Sentence.system, Sentence.case, Sentence.gender, Sentence.number,
+                              Sentence.source_text, Sentence.result, version)
+                rows = (await session.execute(stmt)).all()
+                if rows:
+                    version = rows[0][-1]
+                else:
+                    version = (await session.execute(select(version))).scalar()
+                self.load((row[:-1] for row in rows), version or 0)
+                pending, self._pending = self._pending, None
+                # Изменения, уже вошедшие в прочитанный индекс, пропускаются по версии;
+                # из изменений одной версии первым применяется изменение с добавленными исключениями
+                for change in sorted(pending, key=lambda change: (change['version'], 'added' not in change)):
+                    self.apply_change(change)
+            finally:
+                self._pending = None
+
+    def load(self, rows: Iterable[tuple[Optional[str], str, Optional[str], Optional[str], str, str]],
+             version: int = 0):
+        """
+        Заполнение индекса без обращения к базе, например из выгрузки исключений
+        :param rows: (system, case, gender, number, source_text, result)
+        """
+        index = {}
+        for system, case, gender, number, source_text, result in rows:
+            index.setdefault((system, case, gender, number), {})[source_text] = result
+        self._index = index
+        self._tries = {}
+        self.version = version
+        self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get(self, text: str, key: LookupKey) -> Optional[str]:
+        result = self._index.get(key, {}).get(text)
+        self.lookups += 1
+        self.hits += result is not None
+        return result
+
+    def get_many(self, words: Iterable[str], key: LookupKey) -> dict[str, str]:
+        entries = self._index.get(key, {})
+        results = {}
+        for word in words:
+            self.lookups += 1
+            if word in entries:
+                results[word] = entries[word]
+        self.hits += len(results)
+        return results
+
+    def get_text_exceptions(self, key: LookupKey) -> TextExceptions:
+        entries = self._index.get(key)
+        if entries is None:
+            return TextExceptions({}, empty_trie, self)
+        trie = self._tries.get(key)
+        if trie is None:
+            trie = self._tries[key] = make_trie(entries.items())
+        return TextExceptions(entries, trie, self)
+
+    def add(self, sentence: Sentence):
+        self._add(get_lookup_key(sentence), sentence.source_text, sentence.result)
+
+    def _add(self, key: LookupKey, text: str, result: str):
+        self._index.setdefault(key, {})[text] = result
+        if key in self._tries:
+            self._tries[key].add(text, result)
+
+    def remove(self, key: LookupKey, text: str):
+        entries = self._index.get(key)
+        if entries is not None:
+            entries.pop(text, None)
+        if key in self._tries:
+            self._tries[key].remove(text)
+
+    def set_version(self, version: int):
+        """
+        Версия после изменения, уже внесенного в индекс. Если индекс не содержит предыдущих изменений,
+        он перечитывается
+        """
+        if self._pending is not None:
+            self._pending.append({'version': version})
+            return
+        if version <= self.version:
+            return
+        if version == self.version + 1:
+            self.version = version
+        else:
+            self.invalidate()
+
+    def apply_change(self, change: dict):
+        """
+        Изменение исключений из уведомления другого процесса:
+        {"version": версия, "added": [[key, source_text, result], ...], "removed": [[key, source_text], ...]}.
+        Изменение без added/removed, пропущенная версия или незагруженный индекс - перечитывание индекса
+        """
+        if self._pending is not None:
+            self._pending.append(change)
+            return
+        version = change['version']
+        if version <= self.version:
+            return
+        if self._loaded_at is None or version != self.version + 1 or 'added' not in change:
+            self.invalidate()
+            return
+        for key, text in change.get('removed', []):
+            self.remove(tuple(key), text)
+        for key, text, result in change['added']:
+            self._add(tuple(key), text, result)
+        self.version = version
+
+
+exceptions_cache = ExceptionsCache(ttl=settings.exceptions_cache_ttl)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, AsyncIterable, Literal
+
+from pydantic import ValidationError
+
+from models import DeclensionException, DeclensionExceptionUpdate
+from tables import Sentence
+from utils.ndjson import iter_lines, LineTooLong
+
+
+ImportFormat = Literal['json', 'ndjson', 'csv']
+ExportFormat = Literal['ndjson', 'csv']
+
+# Строка файла: номер записи и исключение либо описание ошибки
+ImportRecord = tuple[int, DeclensionExceptionUpdate | str]
+
+export_fields = ['id', 'source_text', 'case', 'gender', 'number', 'system', 'result']
+nullable_fields = ('gender', 'number', 'system')
+
+import_media_types: dict[str, ImportFormat] = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+def _validate(number: int, data) -> ImportRecord:
+    try:
+        return number, DeclensionExceptionUpdate.model_validate(data)
+    except ValidationError as e:
+        return number, f'Некорректная запись {number}: {e.errors(include_url=False)}'
+
+
+async def read_records(chunks: AsyncIterable[bytes], fmt: ImportFormat, max_line_length: int) -> AsyncIterator[ImportRecord]:
+    """
+    Исключения из загружаемого файла. NDJSON и CSV (запись в одну строку, первая строка - заголовок) читаются
+    потоково, JSON - массив записей целиком. Записи в формате выгрузки, поле id не используется
+    """
+    if fmt == 'json':
+        body = b''.join([chunk async for chunk in chunks])
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            yield 1, f'Некорректный JSON: {e}'
+            return
+        if not isinstance(items, list):
+            yield 1, 'Ожидается массив исключений'
+            return
+        for number, item in enumerate(items, start=1):
+            yield _validate(number, item)
+        return
+
+    lines = iter_lines(chunks, max_line_length)
+    header = None
+    number = 0
+    async for line in lines:
+        if fmt == 'csv' and header is None:
+            if isinstance(line, LineTooLong):
+                yield 0, 'Превышена длина строки заголовка CSV'
+                return
+            header = next(csv.reader([line.decode('utf-8-sig')]))
+            continue
+        number += 1
+        if isinstance(line, LineTooLong):
+            yield number, f'Некорректная запись {number}: превышена длина строки'
+            continue
+        try:
+            if fmt == 'ndjson':
+                data = json.loads(line)
+            else:
+                data = dict(zip(header, next(csv.reader([line.decode('utf-8')]))))
+                # Пустое значение - NULL, для отсутствующей колонки действует значение по умолчанию, как в JSON
+                data.update({field: None for field in nullable_fields if field in data and not data[field]})
+        except ValueError as e:
+            yield number, f'Некорректная запись {number}: {e}'
+            continue
+        yield _validate(number, data)
+
+
+def format_header(fmt: ExportFormat) -> bytes:
+    return format_csv_row(export_fields) if fmt == 'csv' else b''
+
+
+def format_csv_row(values: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['' if value is None else value for value in values])
+    return buffer.getvalue().encode()
+
+
+def format_page(sentences: list[Sentence], fmt: ExportFormat) -> bytes:
+    if fmt == 'csv':
+        return b''.join(format_csv_row([getattr(sentence, field) for field in export_fields])
+                        for sentence in sentences)
+    return b''.join(DeclensionException.model_validate(sentence).model_dump_json().encode() + b'\n'
+                    for sentence in sentences)
@@ -0,0 +1,95 @@
+"""
+Уведомления об изменении исключений между процессами и репликами через PostgreSQL LISTEN/NOTIFY.
+Изменение отправляется в транзакции изменения и доставляется слушателям после ее фиксации,
+слушатели вносят его в индекс исключений процесса без перечитывания таблицы.
+"""
+import asyncio
+import json
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
+
+from tables import Sentence
+from .exceptions_cache import exceptions_cache, get_lookup_key, LookupKey, ExceptionsCache
+
+
+logger = logging.getLogger(__name__)
+
+channel = 'sentence_changes'
+# Ограничение PostgreSQL на размер уведомления - 8000 байт
+max_payload_size = 7900
+
+
+def make_change(version: int, added: Iterable[Sentence] = (),
+                removed: Iterable[tuple[LookupKey, str]] = ()) -> dict:
+    return {
+        'version': version,
+        'added': [[list(get_lookup_key(sentence)), sentence.source_text, sentence.result] for sentence in added],
+        'removed': [[list(key), text] for key, text in removed],
+    }
+
+
+async def notify(session: AsyncSession, change: dict):
+    payload = json.dumps(change, ensure_ascii=False)
+    if len(payload.encode()) > max_payload_size:
+        # Слушатели перечитают индекс целиком
+        payload = json.dumps({'version': change['version']})
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+
+class ExceptionsListener:
+    """
+    Фоновая задача, которая слушает уведомления на отдельном соединении и вносит изменения в индекс исключений.
+    Пока подписка действует, индекс не перечитывается по ttl. После потери соединения индекс снова перечитывается
+    по ttl, а после переподключения - сразу, так как уведомления за это время потеряны
+    """
+    def __init__(self, engine: AsyncEngine, cache: ExceptionsCache = exceptions_cache, retry_interval: float = 5):
+        self.engine = engine
+        self.cache = cache
+        self.fallback_ttl = cache.ttl
+        self.retry_interval = retry_interval
+        self.listening = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notification(self, connection, pid: int, channel_name: str, payload: str):
+        try:
+            self.cache.apply_change(json.loads(payload))
+        except (ValueError, KeyError, TypeError):
+            logger.exception('Некорректное уведомление об изменении исключений: %s', payload)
+            self.cache.invalidate()
+
+    async def _run(self):
+        reconnect = False
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    driver_connection = (await conn.get_raw_connection()).driver_connection
+                    lost = asyncio.Event()
+                    driver_connection.add_termination_listener(lambda _: lost.set())
+                    await driver_connection.add_listener(channel, self._on_notification)
+                    if reconnect:
+                        self.cache.invalidate()
+                    self.cache.ttl = 0
+                    self.listening.set()
+                    await lost.wait()
+            except Exception:
+                logger.exception('Ошибка подписки на уведомления об изменении исключений')
+            finally:
+                self.cache.ttl = self.fallback_ttl
+            self.listening.clear()
+            reconnect = True
+            await asyncio.sleep(self.retry_interval)
@@ -0,0 +1,77 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Callable, TypeVar, Literal
+
+from fastapi import HTTPException, status
+
+from settings import settings
+
+
+T = TypeVar('T')
+
+ExecutorMode = Literal['inline', 'thread', 'process']
+
+
+def _init_process_worker():
+    from . import morphology
+    morphology.preload()
+
+
+class DeclensionExecutor:
+    """
+    Выполняет склонение вне цикла событий для входных данных длиннее threshold символов.
+    Одновременно в пуле выполняется не более max_workers задач, еще max_queue_depth ожидают очереди,
+    остальные запросы отклоняются с кодом 503.
+    """
+    def __init__(self, mode: ExecutorMode, max_workers: Optional[int], threshold: int, max_queue_depth: int):
+        self.mode = mode
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.max_queue_depth = max_queue_depth
+        self._pool: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    def start(self):
+        if self.mode == 'inline' or self._pool is not None:
+            return
+        workers = self.max_workers or os.cpu_count() or 1
+        if self.mode == 'thread':
+            self._pool = ThreadPoolExecutor(workers, thread_name_prefix='declension')
+        else:
+            self._pool = ProcessPoolExecutor(workers, initializer=_init_process_worker)
+        self._semaphore = asyncio.Semaphore(workers)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+            self._semaphore = None
+
+    async def run(self, size: int, func: Callable[..., T], *args) -> T:
+        if self.mode == 'inline' or size < self.threshold:
+            return func(*args)
+        self.start()
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue_depth:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+            self._waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+        finally:
+            self._semaphore.release()
+
+
+declension_executor = DeclensionExecutor(
+    mode=settings.declension_executor_mode,
+    max_workers=settings.declension_executor_workers,
+    threshold=settings.declension_executor_threshold,
+    max_queue_depth=settings.declension_executor_max_queue,
+)
@@ -0,0 +1,99 @@
+from functools import wraps
+from typing import Callable, Awaitable, Iterable, Optional
+
+from sqlalchemy.pool import Pool
+
+from settings import settings
+from utils.metrics import Registry, Histogram, Counter, Gauge, CollectedCounter, Sample
+from .exceptions_cache import exceptions_cache
+
+
+registry = Registry()
+
+declension_duration = registry.register(Histogram(
+    'declension_duration_seconds', 'Длительность склонения', ['operation']))
+# В режиме declension_executor_mode='process' этапы, выполненные в процессах пула, учитываются в их собственных
+# метриках и в /metrics не попадают: там остаются только этапы, выполненные в процессе сервиса
+stage_duration = registry.register(Histogram(
+    'declension_stage_duration_seconds',
+    'Длительность этапов склонения: exception_lookup, parse, inflect, surname, casing',
+    ['stage'],
+))
+declension_duration.enabled = stage_duration.enabled = settings.metrics_enabled
+
+declension_requests = registry.register(Counter(
+    'declension_requests_total',
+    'Количество склонений по системам и падежам',
+    ['operation', 'system', 'case'],
+))
+
+
+def _system_label(system: Optional[str]) -> str:
+    # Система задается клиентом: в метку попадают только перечисленные в настройках, чтобы число серий было ограничено
+    if system is None:
+        return ''
+    return system if system in settings.metrics_systems else 'other'
+
+
+def count_requests(operation: str, requests: Iterable):
+    for request in requests:
+        declension_requests.inc(operation, _system_label(request.system), request.case)
+
+
+def count_paradigm(operation: str, request, cases: Iterable[str]):
+    """Склонение во все запрошенные падежи считается отдельным склонением для каждого падежа"""
+    system = _system_label(request.system)
+    for case in cases:
+        declension_requests.inc(operation, system, case)
+
+
+def timed(operation: str):
+    """Замер полной длительности асинхронного метода сервиса склонения"""
+    def decorator(func: Callable[..., Awaitable]):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with declension_duration.time(operation):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _collect_cache_requests() -> list[Sample]:
+    from .morphology import parse_cache, inflect_cache
+    samples = []
+    for name, cache in (('parse', parse_cache), ('inflect', inflect_cache)):
+        samples.append(((name, 'hit'), cache.hits))
+        samples.append(((name, 'miss'), cache.misses))
+    samples.append((('exceptions', 'hit'), exceptions_cache.hits))
+    samples.append((('exceptions', 'miss'), exceptions_cache.lookups - exceptions_cache.hits))
+    return samples
+
+
+def _collect_cache_size() -> list[Sample]:
+    from .morphology import parse_cache, inflect_cache
+    return [(('parse',), len(parse_cache)), (('inflect',), len(inflect_cache))]
+
+
+def _collect_cache_hit_ratio() -> list[Sample]:
+    from .morphology import parse_cache, inflect_cache
+    samples = []
+    for name, hits, total in (('parse', parse_cache.hits, parse_cache.hits + parse_cache.misses),
+                              ('inflect', inflect_cache.hits, inflect_cache.hits + inflect_cache.misses),
+                              ('exceptions', exceptions_cache.hits, exceptions_cache.lookups)):
+        samples.append(((name,), hits / total if total else 0))
+    return samples
+
+
+registry.register(CollectedCounter(
+    'declension_cache_requests_total', 'Обращения к кэшам морфологии и исключений', ['cache', 'result'],
+    _collect_cache_requests))
+registry.register(Gauge('declension_cache_size', 'Число записей в кэшах морфологии', ['cache'], _collect_cache_size))
+registry.register(Gauge(
+    'declension_cache_hit_ratio', 'Доля попаданий в кэш', ['cache'], _collect_cache_hit_ratio))
+
+
+def register_pool_metrics(pool: Pool):
+    def collect() -> list[Sample]:
+        return [(('size',), pool.size()), (('checked_out',), pool.checkedout()), (('overflow',), pool.overflow())]
+
+    registry.register(Gauge('db_pool_connections', 'Состояние пула соединений с базой', ['state'], collect))
@@ -0,0 +1,128 @@
+import asyncio
+import gc
+import threading
+from typing import Optional, Iterable, TYPE_CHECKING
+
+from settings import settings
+from utils.memoize import MemoCache, MISSING
+from . import names_table
+from .metrics import stage_duration
+
+if TYPE_CHECKING:
+    from nltk.stem import SnowballStemmer
+    from pymorphy3 import MorphAnalyzer
+    from pymorphy3.analyzer import Parse
+
+_morph: Optional['MorphAnalyzer'] = None
+_snowball: Optional['SnowballStemmer'] = None
+_load_lock = threading.Lock()
+
+parse_cache = MemoCache(settings.morph_parse_cache_size, settings.morph_cache_policy, settings.morph_cache_stats)
+inflect_cache = MemoCache(settings.morph_inflect_cache_size, settings.morph_cache_policy, settings.morph_cache_stats)
+
+
+class InflectionException(Exception):
+    pass
+
+
+def get_morph() -> 'MorphAnalyzer':
+    """Анализатор pymorphy3, словари загружаются при первом обращении"""
+    global _morph
+    if _morph is None:
+        with _load_lock:
+            if _morph is None:
+                import pymorphy3
+                _morph = pymorphy3.MorphAnalyzer(lang='ru')
+    return _morph
+
+
+def get_snowball() -> 'SnowballStemmer':
+    global _snowball
+    if _snowball is None:
+        with _load_lock:
+            if _snowball is None:
+                from nltk.stem import SnowballStemmer
+                _snowball = SnowballStemmer(language='russian')
+    return _snowball
+
+
+def is_loaded() -> bool:
+    return _morph is not None and _snowball is not None
+
+
+async def ensure_loaded():
+    """
+    Загрузка словарей в пуле потоков: пока они загружаются (в фоне или при первом запросе),
+    запросы ожидают загрузки, не блокируя цикл событий на блокировке загрузки
+    """
+    if not is_loaded():
+        await asyncio.get_running_loop().run_in_executor(None, _load)
+
+
+def _load():
+    get_morph()
+    get_snowball()
+
+
+def preload(freeze: bool = False):
+    """
+    Загрузка и прогрев анализатора и стеммера
+    :param freeze: Перенести загруженные объекты в постоянное поколение сборщика мусора, чтобы при запуске
+    воркеров через fork их страницы памяти оставались общими (copy-on-write)
+    """
+    get_morph().parse('прогрев')
+    get_snowball().stem('прогрев')
+    names_table.get_table()
+    from . import surname_rules
+    surname_rules.get_rules()
+    surname_rules.template_endings.build()
+    if freeze:
+        gc.collect()
+        gc.freeze()
+
+
+def stem(word: str) -> str:
+    return get_snowball().stem(word)
+
+
+def parse(word: str) -> tuple['Parse', ...]:
+    parsed_words = parse_cache.get(word)
+    if parsed_words is MISSING:
+        with stage_duration.time('parse'):
+            parsed_words = tuple(get_morph().parse(word))
+        parse_cache.set(word, parsed_words)
+    return parsed_words
+
+
+def _inflect(word: str, options: frozenset[str], animacy: bool) -> tuple[str, bool]:
+    parsed_words = parse(word)
+    if animacy:
+        word = next(filter(lambda p: {'NOUN', 'anim', 'nomn'}.issubset(p.tag.grammemes), parsed_words), parsed_words[0])
+    else:
+        word = parsed_words[0]
+    inflected_word = word.inflect(options)
+    return (inflected_word.word, True) if inflected_word else (word.word, False)
+
+
+def get_inflected_word(word: str, options: Iterable[Optional[str]], raise_on_fail=False, animacy=False) -> Optional[str]:
+    """
+    :param word: слово к преобразованию
+    :param options: параметры преобразования
+    :param raise_on_fail: Выбрасывать исключение при ошибке преобразования слова
+    :param animacy: Подобрать одушевленную форму слова
+    """
+    options = frozenset(option for option in options if option is not None)
+    key = (word, options, animacy)
+    result = names_table.lookup(word, options) if animacy else None
+    if result is None:
+        result = inflect_cache.get(key)
+    if result is MISSING:
+        # Разбор замеряется отдельным этапом до замера склонения, чтобы этапы не пересекались
+        parse(word)
+        with stage_duration.time('inflect'):
+            result = _inflect(word, options, animacy)
+        inflect_cache.set(key, result)
+    inflected_word, success = result
+    if not success and raise_on_fail:
+        raise InflectionException()
+    return inflected_word
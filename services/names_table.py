@@ -0,0 +1,91 @@
+"""
+Предрасчитанная таблица склонений частых имен и отчеств. Сборка таблицы из словаря data/names.txt:
+
+    python -m scripts.build_names_table [--output data/names_table.json.gz]
+
+Таблица хранит результат get_inflected_word(word, options, animacy=True) для всех сочетаний падежа, рода и числа,
+поэтому ее использование не меняет результаты склонения.
+"""
+import gzip
+import itertools
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+from models import Case, Gender, Number
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+root = Path(__file__).parent.parent
+vocabulary_path = root / 'data' / 'names.txt'
+
+# Все сочетания параметров склонения в порядке хранения форм слова в таблице
+options_list = [
+    frozenset(option for option in options if option is not None)
+    for options in itertools.product([case.name for case in Case],
+                                     [None, *(gender.name for gender in Gender)],
+                                     [None, *(number.name for number in Number)])
+]
+
+NamesTable = dict[tuple[str, frozenset[str]], tuple[str, bool]]
+
+_table: Optional[NamesTable] = None
+_load_lock = threading.Lock()
+
+
+def _resolve(path: str) -> Path:
+    path = Path(path)
+    return path if path.is_absolute() else root / path
+
+
+def load(path: str) -> NamesTable:
+    with gzip.open(_resolve(path), 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    stored_options = [frozenset(options) for options in data['options']]
+    table = {}
+    for word, forms in data['words'].items():
+        for options, form in zip(stored_options, forms):
+            # Форма, которую не удалось получить, хранится списком из исходного разбора слова
+            table[(word, options)] = (form[0], False) if isinstance(form, list) else (form, True)
+    return table
+
+
+def get_table() -> NamesTable:
+    global _table
+    if _table is None:
+        with _load_lock:
+            if _table is None:
+                try:
+                    _table = load(settings.names_table_path) if settings.names_table_enabled else {}
+                except FileNotFoundError:
+                    logger.warning('Таблица склонений имен %s не найдена', settings.names_table_path)
+                    _table = {}
+    return _table
+
+
+def lookup(word: str, options: frozenset[str]) -> Optional[tuple[str, bool]]:
+    return get_table().get((word.lower(), options))
+
+
+def read_vocabulary(path: Path = vocabulary_path) -> list[str]:
+    words = [settings.male_common_name, settings.female_common_name]
+    with open(path, encoding='utf-8') as f:
+        words.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return list(dict.fromkeys(word.lower() for word in words))
+
+
+def build(words: list[str]) -> dict:
+    from .morphology import _inflect
+
+    table = {}
+    for word in words:
+        forms = []
+        for options in options_list:
+            form, success = _inflect(word, options, animacy=True)
+            forms.append(form if success else [form])
+        table[word] = forms
+    return {'options': [sorted(options) for options in options_list], 'words': table}
@@ -0,0 +1,50 @@
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from models import BatchResult
+from utils.ndjson import LineTooLong
+
+
+M = TypeVar('M', bound=BaseModel)
+
+
+async def _decline_chunk(lines: list[bytes | LineTooLong], model: type[M],
+                         decline_batch: Callable[[list[M]], Awaitable[list[BatchResult]]]) -> bytes:
+    results: list[BatchResult | None] = []
+    requests, positions = [], []
+    for line in lines:
+        if isinstance(line, LineTooLong):
+            results.append(BatchResult(error='Некорректная запись: превышена длина строки'))
+            continue
+        try:
+            request = model.model_validate_json(line)
+        except ValidationError as e:
+            results.append(BatchResult(error=f'Некорректная запись: {e.errors(include_url=False)}'))
+            continue
+        positions.append(len(results))
+        results.append(None)
+        requests.append(request)
+
+    if requests:
+        for position, result in zip(positions, await decline_batch(requests)):
+            results[position] = result
+    return b''.join(result.model_dump_json().encode() + b'\n' for result in results)
+
+
+async def decline_stream(lines: AsyncIterator[bytes | LineTooLong], model: type[M],
+                         decline_batch: Callable[[list[M]], Awaitable[list[BatchResult]]],
+                         chunk_size: int) -> AsyncIterator[bytes]:
+    """
+    Склонение потока записей NDJSON пакетами по chunk_size записей, по одному результату NDJSON на запись
+    в порядке записей. В памяти одновременно находится не больше одного пакета
+    :param decline_batch: пакетное склонение, например DeclensionNameService.get_inflected_person_names
+    """
+    chunk = []
+    async for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield await _decline_chunk(chunk, model, decline_batch)
+            chunk = []
+    if chunk:
+        yield await _decline_chunk(chunk, model, decline_batch)
@@ -0,0 +1,170 @@
+"""
+Правила склонения фамилий, для которых нет исключений. Правила задаются в data/surname_rules.json:
+default - общие правила, systems - правила отдельных систем, которые проверяются раньше всех общих правил
+независимо от длины окончаний.
+
+Правило применяется к фамилиям, которые оканчиваются на один из suffixes ("" - любая фамилия), и, если указан
+gender, только для этого рода. Внутри набора первым проверяется правило с самым длинным подходящим окончанием,
+правила с одинаковым окончанием - в порядке файла. Действия:
+    template - фамилия без strip последних букв и окончание шаблонного слова (male_common_name/female_common_name)
+    keep - фамилия не склоняется
+    inflect - склонение pymorphy3, если оно не удалось, проверяется следующее правило
+    stem - основа фамилии Snowball и окончание шаблонного слова
+"""
+import itertools
+import json
+import threading
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from models import Case, Gender, Number
+from settings import settings
+from .morphology import get_inflected_word, stem, InflectionException
+
+
+root = Path(__file__).parent.parent
+
+actions = ('template', 'keep', 'inflect', 'stem')
+
+
+class Rule(NamedTuple):
+    action: str
+    strip: int = 0
+    gender: Optional[str] = None
+
+
+class _Node:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.rules: list[Rule] = []
+
+
+class SurnameRules:
+    """
+    Правила в дереве по перевернутым окончаниям: подходящие правила находятся за один проход по фамилии.
+    Правила fallback (общие) проверяются после всех подходящих правил этого набора
+    """
+    def __init__(self, rules: list[tuple[str, Rule]], fallback: Optional['SurnameRules'] = None):
+        self.fallback = fallback
+        self._root = _Node()
+        for suffix, rule in rules:
+            node = self._root
+            for letter in reversed(suffix):
+                node = node.children.setdefault(letter, _Node())
+            node.rules.append(rule)
+
+    def match(self, surname: str) -> list[Rule]:
+        """Подходящие правила от самого длинного окончания к самому короткому"""
+        found = [self._root.rules]
+        node = self._root
+        for letter in reversed(surname):
+            node = node.children.get(letter)
+            if node is None:
+                break
+            if node.rules:
+                found.append(node.rules)
+        rules = [rule for rules in reversed(found) for rule in rules]
+        if self.fallback is not None:
+            rules.extend(self.fallback.match(surname))
+        return rules
+
+    def decline(self, surname: str, options: tuple[Optional[str], ...], ending: str) -> str:
+        """
+        :param options: падеж, пол, число
+        :param ending: окончание шаблонного слова в этих падеже, роде и числе
+        """
+        gender = options[1]
+        for rule in self.match(surname):
+            if rule.gender is not None and rule.gender != gender:
+                continue
+            if rule.action == 'template':
+                return surname[:len(surname) - rule.strip] + ending
+            if rule.action == 'keep':
+                return surname.lower()
+            if rule.action == 'stem':
+                return stem(surname) + ending
+            try:
+                return get_inflected_word(surname, options, raise_on_fail=True, animacy=True)
+            except InflectionException:
+                continue
+        return surname
+
+
+_rules: Optional[dict[Optional[str], SurnameRules]] = None
+_load_lock = threading.Lock()
+
+
+def _parse(items: list[dict]) -> list[tuple[str, Rule]]:
+    rules = []
+    for item in items:
+        if item['action'] not in actions:
+            raise ValueError(f'Unknown surname rule action: {item["action"]}')
+        rule = Rule(item['action'], item.get('strip', 0), item.get('gender'))
+        rules.extend((suffix, rule) for suffix in item['suffixes'])
+    return rules
+
+
+def load(path: str) -> dict[Optional[str], SurnameRules]:
+    path = Path(path)
+    with open(path if path.is_absolute() else root / path, encoding='utf-8') as f:
+        data = json.load(f)
+    default = SurnameRules(_parse(data['default']))
+    compiled = {None: default}
+    for system, items in data.get('systems', {}).items():
+        compiled[system] = SurnameRules(_parse(items), fallback=default)
+    return compiled
+
+
+def get_rules(system: Optional[str] = None) -> SurnameRules:
+    global _rules
+    if _rules is None:
+        with _load_lock:
+            if _rules is None:
+                _rules = load(settings.surname_rules_path)
+    return _rules.get(system) or _rules[None]
+
+
+def reset():
+    """Перечитать правила при следующем обращении"""
+    global _rules
+    _rules = None
+
+
+class TemplateEndings:
+    """
+    Окончания шаблонного слова (male_common_name для мужского рода, female_common_name для остальных)
+    для всех сочетаний падежа, рода и числа. Таблица пересчитывается, если шаблонные слова в настройках изменились
+    """
+    def __init__(self):
+        # Шаблонные слова и таблица, по ним построенная, заменяются вместе
+        self._state: tuple[Optional[tuple[str, str]], dict[tuple[Optional[str], ...], str]] = (None, {})
+
+    @staticmethod
+    def compute(options: tuple[Optional[str], ...]) -> str:
+        common_name = settings.male_common_name if options[1] == Gender.masc.name else settings.female_common_name
+        template_word = get_inflected_word(common_name, options, animacy=True)
+        return template_word[len(stem(template_word)):]
+
+    def build(self):
+        names = (settings.male_common_name, settings.female_common_name)
+        table = {
+            options: self.compute(options)
+            for options in itertools.product([case.name for case in Case],
+                                             [None, *(gender.name for gender in Gender)],
+                                             [None, *(number.name for number in Number)])
+        }
+        self._state = (names, table)
+
+    def get(self, options: tuple[Optional[str], ...]) -> str:
+        """:param options: падеж, пол, число"""
+        names, table = self._state
+        if names != (settings.male_common_name, settings.female_common_name):
+            self.build()
+            names, table = self._state
+        ending = table.get(options)
+        return ending if ending is not None else self.compute(options)
+
+
+template_endings = TemplateEndings()
@@ -1,9 +1,21 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     server_host: str = '0.0.0.0'
     server_port: int = '8080'
+    server_mode: Literal['development', 'production'] = 'development'
+    server_workers: Optional[int] = None
+    server_loop: Literal['auto', 'asyncio', 'uvloop'] = 'auto'
+    server_http: Literal['auto', 'h11', 'httptools'] = 'auto'
+    server_backlog: int = 2048
+    server_keep_alive: int = 5
+    server_graceful_timeout: Optional[int] = 30
+    # Задержка перезапуска упавшего воркера, удваивается при каждом падении подряд до server_respawn_max_delay
+    server_respawn_delay: float = 1
+    server_respawn_max_delay: float = 60
     timezone: str = 'Asia/Yekaterinburg'
 
     db_dialect: str = 'postgresql+asyncpg'
@@ -13,10 +25,58 @@ class Settings(BaseSettings):
     db_port: str = '5432'
     db_database: str = 'Declension'
     test_database: str = 'TestDatabase'
+    db_migrate_on_startup: bool = True
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_prepared_statement_cache_size: int = 100
 
     male_common_name: str = "Филиппов"
     female_common_name: str = "Тополиная"
 
+    exceptions_cache_enabled: bool = True
+    # Пока действует подписка на уведомления об изменениях, индекс по ttl не перечитывается
+    exceptions_cache_ttl: float = 60
+    exceptions_notify_enabled: bool = True
+    exceptions_notify_connect_timeout: float = 10
+    exceptions_max_words: int = 10
+    # Без индекса в памяти: фрагментов одного текста в запросе исключений к базе (от коротких к длинным)
+    exceptions_max_fragments: int = 500
+    # Пар (параметры склонения, текст) в одном запросе исключений к базе без индекса в памяти
+    exceptions_lookup_chunk_size: int = 5000
+    exceptions_import_batch_size: int = 1000
+    exceptions_export_page_size: int = 1000
+    exceptions_page_size: int = 100
+    exceptions_page_max_size: int = 1000
+
+    morph_cache_policy: Literal['lru', 'lfu'] = 'lru'
+    morph_parse_cache_size: int = 20000
+    morph_inflect_cache_size: int = 50000
+    morph_cache_stats: bool = True
+    # preload - при импорте приложения до fork воркеров, startup - при запуске, background - в фоне
+    # с готовностью по /ready, lazy - при первом склонении
+    morph_load_mode: Literal['preload', 'startup', 'background', 'lazy'] = 'startup'
+    names_table_enabled: bool = True
+    names_table_path: str = 'data/names_table.json.gz'
+    surname_rules_path: str = 'data/surname_rules.json'
+
+    declension_executor_mode: Literal['inline', 'thread', 'process'] = 'inline'
+    declension_executor_workers: Optional[int] = None
+    declension_executor_threshold: int = 200
+    declension_executor_max_queue: int = 100
+
+    response_cache_max_age: int = 0
+
+    batch_max_size: int = 10000
+    stream_chunk_size: int = 500
+    stream_max_line_length: int = 65536
+
+    metrics_enabled: bool = True
+    # Системы, которые выделяются в метриках отдельной меткой, остальные учитываются как other
+    metrics_systems: list[str] = []
+
 
 settings = Settings(
     _env_file='.env',
@@ -1,6 +1,8 @@
+import json
 from datetime import datetime
+from typing import Optional
 
-from sqlalchemy import func
+from sqlalchemy import func, Index, BigInteger
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -10,6 +12,11 @@ class Base(DeclarativeBase):
     pass
 
 
+def make_lookup_key(system: Optional[str], case: str, gender: Optional[str], number: Optional[str]) -> str:
+    """Ключ параметров склонения без NULL, чтобы поиск исключения был одним проходом по индексу"""
+    return json.dumps([system, case, gender, number], ensure_ascii=False)
+
+
 class Sentence(Base):
     __tablename__ = 'sentence'
 
@@ -21,3 +28,18 @@ class Sentence(Base):
     result: Mapped[str]
     create_datetime: Mapped[datetime] = mapped_column(insert_default=func.now())
     system: Mapped[str] = mapped_column(nullable=True)
+    lookup_key: Mapped[str]
+
+    __table_args__ = (
+        Index('ix_sentence_lookup', 'lookup_key', 'source_text', unique=True),
+        Index('ix_sentence_system', 'system', 'id'),
+        Index('ix_sentence_source_text', 'source_text', postgresql_ops={'source_text': 'text_pattern_ops'}),
+    )
+
+
+class ExceptionsVersion(Base):
+    """Версия набора исключений, увеличивается при каждом изменении исключений"""
+    __tablename__ = 'exceptions_version'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    version: Mapped[int] = mapped_column(BigInteger)
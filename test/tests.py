@@ -1,3 +1,9 @@
+import argparse
+import asyncio
+import csv
+import json
+import threading
+
 import pytest, pytest_asyncio
 
 from httpx import AsyncClient
@@ -6,13 +12,23 @@ from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from fastapi import status, FastAPI
+from fastapi import status, FastAPI, HTTPException
 
+import bulk
 from app import app
-from database import get_session
+from api.dependencies import init_services
+from models import PersonNameDeclension
 from tables import Base
 from settings import settings
 from utils.casing_manager import get_words_casing, apply_words_cases, apply_cases
+from utils.memoize import MemoCache, MISSING
+from utils.metrics import Counter, Histogram
+from utils.token_trie import TokenTrie
+from services import morphology, names_table, surname_rules, declension, DeclensionTextService, DeclensionExceptionsService
+from services.morphology import _inflect
+from services.exceptions_cache import exceptions_cache, ExceptionsCache
+from services.exceptions_notifications import ExceptionsListener
+from services.executor import DeclensionExecutor, declension_executor
 
 
 url_object_to_test_db = URL.create(
@@ -26,22 +42,14 @@ url_object_to_test_db = URL.create(
 
 engine = create_async_engine(url_object_to_test_db, poolclass=NullPool)
 Session = async_sessionmaker(engine, expire_on_commit=False)
-
-
-async def get_test_session():
-    session = Session()
-    await session.begin()
-    try:
-        yield session
-    finally:
-        await session.close()
+ReadSession = async_sessionmaker(engine.execution_options(isolation_level='AUTOCOMMIT'), expire_on_commit=False)
 
 
 @pytest_asyncio.fixture(scope="session")
 async def test_application() -> FastAPI:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    app.dependency_overrides[get_session] = get_test_session
+    init_services(app, Session, ReadSession)
     yield app
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -123,6 +131,77 @@ class TestDeclensionExceptions:
         expected_result = 'Мерзлячкина Арбуза Арбузовича'
         assert response.json()['result'] == expected_result
 
+    @pytest.mark.anyio
+    async def test_declension_without_cache(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', False)
+        response = await client.post("exceptions/", json={
+            'source_text': 'Арбуз',
+            'case': 'datv',
+            'gender': 'masc',
+            'target_text': 'Арбузику',
+            'system': 'Тест'
+        })
+        entity_id = int(response.json()['id'])
+
+        response = await client.post("/person_name", json={
+            'fullname': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'datv',
+            'system': 'Тест'
+        })
+        expected_result = 'Мерзлячкину Арбузику Арбузовичу'
+        assert response.json()['result'] == expected_result
+        await client.delete(f"exceptions/{entity_id}")
+
+    @pytest.mark.anyio
+    async def test_declension_exception_conflict(self, declension_exception, client):
+        response = await client.post("exceptions/", json={
+            'source_text': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'gent',
+            'gender': 'masc',
+            'target_text': 'Мерзлячкина Арбуза Арбузовича',
+            'system': 'Тест'
+        })
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+        response = await client.post("exceptions/", json={
+            'source_text': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'gent',
+            'target_text': 'Мерзлячкина Арбуза Арбузовича',
+            'system': 'Тест'
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+        entity_id = int(response.json()['id'])
+
+        response = await client.put(f"exceptions/{entity_id}", json={
+            'source_text': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'gent',
+            'gender': 'masc',
+            'result': 'Мерзлячкина Арбуза Арбузовича',
+            'system': 'Тест'
+        })
+        assert response.status_code == status.HTTP_409_CONFLICT
+        await client.delete(f"exceptions/{entity_id}")
+
+    @pytest.mark.anyio
+    async def test_declension_exception_update(self, declension_exception, client):
+        response = await client.put(f"exceptions/{declension_exception}", json={
+            'source_text': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'gent',
+            'gender': 'masc',
+            'result': 'Мерзлячкина Арбуза Арбузовичу',
+            'system': 'Тест'
+        })
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await client.post("/person_name", json={
+            'fullname': 'Мерзлячкин Арбуз Арбузович',
+            'case': 'gent',
+            'gender': 'masc',
+            'system': 'Тест'
+        })
+        expected_result = 'Мерзлячкина Арбуза Арбузовичу'
+        assert response.json()['result'] == expected_result
+
 
 class TestDeclensionText:
     @pytest.mark.anyio
@@ -154,8 +233,118 @@ class TestDeclensionText:
         assert response.status_code == 200
         assert response.json()['result'] == expected_result
 
+    @pytest.mark.anyio
+    async def test_text_punctuation_and_spaces(self, client):
+        response = await client.post('/', json={
+            'source_text': "Иванов,  Петров и (Сидоров)",
+            'case': 'gent'
+        })
+        expected_result = "Иванова,  Петрова и (Сидорова)"
+        assert response.json()['result'] == expected_result
+
+    @pytest.mark.anyio
+    async def test_quoted_names_not_inflected(self, client):
+        response = await client.post('/batch', json=[
+            {'source_text': 'ООО «Ромашка»', 'case': 'gent'},
+            {'source_text': 'Директор ООО "Зеленая роща", филиал', 'case': 'gent'},
+            {'source_text': 'Директор «Рога и копыта» Иванов', 'case': 'datv'},
+        ])
+        assert [item['result'] for item in response.json()] == [
+            'ООО «Ромашка»',
+            'Директора ООО "Зеленая роща", филиала',
+            'Директору «Рога и копыта» Иванову',
+        ]
+
+    def test_repeated_words_inflected_once(self, monkeypatch):
+        calls = []
+
+        def get_inflected_word(word, options):
+            calls.append(word)
+            return morphology.get_inflected_word(word, options)
+
+        monkeypatch.setattr(declension, 'get_inflected_word', get_inflected_word)
+        source_text = 'Петров и ПЕТРОВ и Петров'
+        tokens, _ = DeclensionTextService._tokenize(source_text)
+        result = DeclensionTextService.inflect_text(source_text, tokens, ('gent', None, None), [])
+        assert result == 'Петрова и ПЕТРОВа и Петрова'
+        assert sorted(calls) == ['ПЕТРОВ', 'Петров', 'и']
+
+    @pytest.mark.anyio
+    @pytest.mark.parametrize('cache_enabled', [True, False])
+    async def test_multiword_exception_inside_text(self, client, monkeypatch, cache_enabled):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', cache_enabled)
+        response = await client.post("exceptions/", json={
+            'source_text': 'Рога и копыта', 'case': 'gent', 'target_text': 'Рогов и копыт'
+        })
+        entity_id = response.json()['id']
+        try:
+            payload = {'source_text': 'Директор ООО РОГА И КОПЫТА', 'case': 'gent'}
+            response = await client.post('/', json=payload)
+            assert response.json()['result'] == 'Директора ООО РОГА И КОПЫТА'
+
+            payload = {'source_text': 'Директор Рога и копыта', 'case': 'gent'}
+            hits = exceptions_cache.hits
+            response = await client.post('/', json=payload)
+            assert response.json()['result'] == 'Директора Рогов и копыт'
+            assert exceptions_cache.hits == hits + cache_enabled
+            response = await client.post('/batch', json=[payload])
+            assert response.json()[0]['result'] == 'Директора Рогов и копыт'
+
+            payload = {'source_text': 'Директор «Рога и копыта», ООО', 'case': 'gent'}
+            response = await client.post('/', json=payload)
+            assert response.json()['result'] == 'Директора «Рогов и копыт», ООО'
+
+            # Длина вхождений ограничена одинаково с индексом в памяти и без него
+            monkeypatch.setattr(settings, 'exceptions_max_words', 2)
+            exceptions_cache.invalidate()
+            response = await client.post('/', json={'source_text': 'Директор Рога и копыта', 'case': 'gent'})
+            assert response.json()['result'] != 'Директора Рогов и копыт'
+        finally:
+            await client.delete(f"exceptions/{entity_id}")
+            exceptions_cache.invalidate()
+
+    def test_text_fragments_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_max_fragments', 50)
+        text = ' '.join(f'«слово{i}»' for i in range(100))
+        fragments = DeclensionExceptionsService._text_fragments(text)
+        assert len(fragments) == 50
+        # Сначала весь текст, затем отдельные слова со знаками препинания и без них
+        assert fragments[:5] == [text, '«слово0»', 'слово0', '«слово1»', 'слово1']
+        assert '«слово30»' not in fragments
+
 
 class TestDeclensionPersonName:
+    @pytest.mark.anyio
+    async def test_system_surname_rules(self, client, monkeypatch, tmp_path):
+        with open(surname_rules.root / settings.surname_rules_path, encoding='utf-8') as f:
+            rules = json.load(f)
+        # Окончание правила системы короче общего "ов", но правило системы проверяется раньше
+        rules['systems']['Несклоняемые'] = [{'suffixes': [''], 'action': 'keep'}]
+        path = tmp_path / 'surname_rules.json'
+        path.write_text(json.dumps(rules), encoding='utf-8')
+        monkeypatch.setattr(settings, 'surname_rules_path', str(path))
+        surname_rules.reset()
+        try:
+            payload = {'fullname': 'Хероведов Андрей Михайлович', 'case': 'datv'}
+            response = await client.post('/person_name', json={**payload, 'system': 'Несклоняемые'})
+            assert response.json()['result'] == 'Хероведов Андрею Михайловичу'
+            response = await client.post('/person_name', json=payload)
+            assert response.json()['result'] == 'Хероведову Андрею Михайловичу'
+        finally:
+            surname_rules.reset()
+
+    def test_template_endings(self, monkeypatch):
+        endings = surname_rules.TemplateEndings()
+        assert endings.get(('datv', 'masc', None)) == 'у'
+        assert endings.get(('datv', 'femn', None)) == 'ой'
+        monkeypatch.setattr(settings, 'male_common_name', settings.female_common_name)
+        assert endings.get(('datv', 'masc', None)) == 'ому'
+
+    def test_surname_rules_match_order(self):
+        rules = surname_rules.get_rules()
+        assert [rule.action for rule in rules.match('Тополиная')][:2] == ['template', 'keep']
+        assert [rule.action for rule in rules.match('Кузнец')] == ['inflect', 'stem']
+
     @pytest.mark.anyio
     async def test_inflected_person_name_by_fullname(self, client):
         response = await client.post('/person_name', json={
@@ -337,6 +526,473 @@ class TestDeclensionPersonName:
         assert response.json()['result'] == expected_result
 
 
+class TestExceptionsImportExport:
+    @pytest.mark.anyio
+    async def test_import_export(self, client):
+        records = [
+            {'source_text': 'Пельмешкин', 'case': 'gent', 'gender': 'masc', 'system': 'Импорт', 'result': 'Пельмешкина'},
+            {'source_text': 'Орех', 'case': 'gent', 'system': 'Импорт', 'result': 'Ореха'},
+            {'source_text': 'Орех', 'case': 'gent', 'system': 'Импорт', 'result': 'Ореху'},
+        ]
+        content = '\n'.join(json.dumps(record, ensure_ascii=False) for record in records).encode()
+        headers = {'content-type': 'application/x-ndjson'}
+        response = await client.post('/exceptions/import', content=content, headers=headers)
+        assert response.json() == {'inserted': 2, 'updated': 0, 'skipped': 1, 'errors': []}
+
+        response = await client.post('/exceptions/import?overwrite=false', content=content, headers=headers)
+        assert response.json() == {'inserted': 0, 'updated': 0, 'skipped': 3, 'errors': []}
+
+        csv_content = 'source_text,case,gender,number,system,result\nОрех,gent,,sing,Импорт,Орешек\n'
+        response = await client.post('/exceptions/import', content=csv_content.encode(),
+                                     headers={'content-type': 'text/csv'})
+        assert response.json() == {'inserted': 0, 'updated': 1, 'skipped': 0, 'errors': []}
+
+        # Без колонки number действует значение по умолчанию, как при загрузке JSON
+        csv_content = 'source_text,case,system,result\nОрех,gent,Импорт,Орешка\n'
+        response = await client.post('/exceptions/import', content=csv_content.encode(),
+                                     headers={'content-type': 'text/csv'})
+        assert response.json() == {'inserted': 0, 'updated': 1, 'skipped': 0, 'errors': []}
+
+        response = await client.get('/exceptions/export', params={'system': 'Импорт'})
+        assert response.headers['content-type'] == 'application/x-ndjson'
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        assert [(item['source_text'], item['result']) for item in exported] == [
+            ('Пельмешкин', 'Пельмешкина'), ('Орех', 'Орешка')]
+
+        response = await client.get('/exceptions/export', params={'system': 'Импорт', 'format': 'csv'})
+        rows = list(csv.DictReader(response.text.splitlines()))
+        assert [row['result'] for row in rows] == ['Пельмешкина', 'Орешка']
+        assert rows[1]['gender'] == ''
+
+        for item in exported:
+            await client.delete(f"exceptions/{item['id']}")
+
+    @pytest.mark.anyio
+    async def test_import_errors(self, client):
+        response = await client.post('/exceptions/import', json=[
+            {'source_text': 'Пельмешкин', 'case': 'gent', 'system': 'Импорт', 'result': 'Пельмешкина'},
+            {'source_text': 'Орех', 'case': 'unknown', 'system': 'Импорт', 'result': 'Ореха'},
+        ])
+        result = response.json()
+        assert result['inserted'] == 0 and len(result['errors']) == 1
+        response = await client.get('/exceptions/export', params={'system': 'Импорт'})
+        assert response.text == ''
+
+    @pytest.mark.anyio
+    async def test_import_unsupported_media_type(self, client):
+        response = await client.post('/exceptions/import', content=b'<xml/>', headers={'content-type': 'text/xml'})
+        assert response.status_code == status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+
+
+class TestExceptionsListing:
+    @pytest_asyncio.fixture
+    async def exceptions(self, client):
+        records = [{'source_text': text, 'case': case, 'system': 'Страницы', 'result': text}
+                   for text, case in [('Орех', 'gent'), ('Орешник', 'gent'), ('Орех', 'datv'), ('100%', 'gent')]]
+        await client.post('/exceptions/import', json=records)
+        response = await client.get('/exceptions/Страницы')
+        yield response.json()
+        for item in response.json():
+            await client.delete(f"exceptions/{item['id']}")
+
+    @pytest.mark.anyio
+    async def test_keyset_pagination(self, exceptions, client):
+        assert len(exceptions) == 4
+        response = await client.get('/exceptions/Страницы', params={'limit': 3})
+        assert [item['id'] for item in response.json()] == [item['id'] for item in exceptions[:3]]
+        after_id = response.headers['X-Next-After-Id']
+        response = await client.get('/exceptions/Страницы', params={'limit': 3, 'after_id': after_id})
+        assert [item['id'] for item in response.json()] == [exceptions[3]['id']]
+        assert 'X-Next-After-Id' not in response.headers
+
+    @pytest.mark.anyio
+    async def test_filters(self, exceptions, client):
+        response = await client.get('/exceptions/', params={'system': 'Страницы', 'source_text_prefix': 'Оре',
+                                                            'case': 'gent'})
+        assert [item['source_text'] for item in response.json()] == ['Орех', 'Орешник']
+        response = await client.get('/exceptions/count', params={'system': 'Страницы', 'source_text_prefix': '100%'})
+        assert response.json() == {'count': 1}
+        response = await client.get('/exceptions/count', params={'system': 'Страницы', 'source_text_prefix': '1_0'})
+        assert response.json() == {'count': 0}
+        response = await client.get('/exceptions/count', params={'system': 'Страницы'})
+        assert response.json() == {'count': 4}
+
+
+class TestConditionalRequests:
+    @pytest.mark.anyio
+    async def test_etag(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', True)
+        params = {'fullname': 'Мерзлячкин Арбуз Арбузович', 'case': 'gent', 'gender': 'masc', 'system': 'Тест'}
+        response = await client.get('/person_name', params=params)
+        assert response.json()['result'] == 'Мерзлячкина Арбуза Арбузовича'
+        etag = response.headers['etag']
+        assert response.headers['cache-control'] == 'no-cache'
+
+        response = await client.get('/person_name', params=params, headers={'if-none-match': etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers['etag'] == etag
+
+        response = await client.get('/person_name', params={**params, 'case': 'datv'},
+                                    headers={'if-none-match': etag})
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await client.post('/person_name', json=params)
+        assert response.headers['etag'] == etag
+        response = await client.post('/person_name', json=params, headers={'if-none-match': etag})
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+        monkeypatch.setattr(settings, 'male_common_name', 'Иванов')
+        response = await client.get('/person_name', params=params, headers={'if-none-match': etag})
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.anyio
+    async def test_etag_changes_with_text_settings(self, client, monkeypatch, tmp_path):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', True)
+        params = {'source_text': 'Рога и копыта', 'case': 'gent'}
+        etag = (await client.get('/', params=params)).headers['etag']
+
+        monkeypatch.setattr(settings, 'exceptions_max_words', 2)
+        max_words_etag = (await client.get('/', params=params)).headers['etag']
+        assert max_words_etag != etag
+
+        rules = tmp_path / 'surname_rules.json'
+        rules.write_text(json.dumps({'default': [{'suffixes': [''], 'action': 'keep'}]}), encoding='utf-8')
+        monkeypatch.setattr(settings, 'surname_rules_path', str(rules))
+        assert (await client.get('/', params=params)).headers['etag'] != max_words_etag
+
+    @pytest.mark.anyio
+    async def test_no_etag_without_cache(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', False)
+        response = await client.get('/', params={'source_text': 'Орех', 'case': 'gent'})
+        assert response.json()['result'] == 'Ореха'
+        assert 'etag' not in response.headers
+
+    @pytest.mark.anyio
+    async def test_etag_changes_with_exceptions(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', True)
+        payload = {'fullname': 'Мерзлячкин Арбуз Арбузович', 'case': 'gent', 'gender': 'masc', 'system': 'Тест'}
+        etag = (await client.post('/person_name', json=payload)).headers['etag']
+        text_etag = (await client.post('/', json={'source_text': 'Орех', 'case': 'gent'})).headers['etag']
+
+        response = await client.post("exceptions/", json={**payload, 'source_text': payload.pop('fullname'),
+                                                          'target_text': 'Мерзлячкину Арбуз Арбузовичу'})
+        entity_id = response.json()['id']
+        response = await client.post('/person_name', json=payload | {'fullname': 'Мерзлячкин Арбуз Арбузович'},
+                                     headers={'if-none-match': etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['result'] == 'Мерзлячкину Арбуз Арбузовичу'
+        response = await client.post('/', json={'source_text': 'Орех', 'case': 'gent'},
+                                     headers={'if-none-match': text_etag})
+        assert response.status_code == status.HTTP_200_OK
+        await client.delete(f"exceptions/{entity_id}")
+
+
+class TestExceptionsNotifications:
+    def test_apply_change(self):
+        cache = ExceptionsCache(ttl=0)
+        key = ('Тест', 'gent', None, None)
+        cache.load([('Тест', 'gent', None, None, 'Орех', 'Ореха')], version=3)
+
+        cache.apply_change({'version': 4, 'added': [[list(key), 'Арбуз', 'Арбуза']], 'removed': [[list(key), 'Орех']]})
+        assert cache.version == 4 and not cache.is_stale
+        assert cache.get('Арбуз', key) == 'Арбуза'
+        assert cache.get('Орех', key) is None
+
+        cache.apply_change({'version': 4, 'added': [[list(key), 'Орех', 'Ореха']], 'removed': []})
+        assert cache.get('Орех', key) is None
+
+        cache.apply_change({'version': 6, 'added': [], 'removed': []})
+        assert cache.is_stale
+
+    def test_set_version(self):
+        cache = ExceptionsCache(ttl=0)
+        cache.load([], version=3)
+        cache.set_version(4)
+        assert cache.version == 4 and not cache.is_stale
+        cache.set_version(6)
+        assert cache.is_stale
+
+    @pytest.mark.anyio
+    async def test_change_during_refresh(self, client):
+        cache = ExceptionsCache(ttl=0)
+        key = ('Уведомления', 'gent', None, 'sing')
+        async with Session() as session:
+            await cache.refresh(session, force=True)
+        version = cache.version
+
+        class ChangingSession:
+            """Изменение приходит, пока индекс читается из базы"""
+            def __init__(self, session):
+                self.session = session
+
+            async def execute(self, statement):
+                result = await self.session.execute(statement)
+                cache.apply_change({'version': version + 1, 'added': [[key, 'Орех', 'Орешка']], 'removed': []})
+                cache.set_version(version + 1)
+                return result
+
+        async with Session() as session:
+            await cache.refresh(ChangingSession(session), force=True)
+        assert cache.version == version + 1
+        assert cache.get('Орех', key) == 'Орешка'
+        assert not cache.is_stale
+
+    @pytest.mark.anyio
+    async def test_listener(self, client):
+        cache = ExceptionsCache(ttl=60)
+        async with Session() as session:
+            await cache.refresh(session, force=True)
+        listener = ExceptionsListener(engine, cache=cache, retry_interval=0.1)
+        listener.start()
+        key = ('Уведомления', 'gent', None, 'sing')
+        try:
+            await asyncio.wait_for(listener.listening.wait(), 5)
+            assert cache.ttl == 0
+            response = await client.post("exceptions/", json={
+                'source_text': 'Орех', 'case': 'gent', 'target_text': 'Орешка', 'system': 'Уведомления'
+            })
+            entity_id = response.json()['id']
+            for _ in range(50):
+                if cache.get('Орех', key):
+                    break
+                await asyncio.sleep(0.1)
+            assert cache.get('Орех', key) == 'Орешка'
+            assert not cache.is_stale
+
+            await client.delete(f"exceptions/{entity_id}")
+            for _ in range(50):
+                if cache.get('Орех', key) is None:
+                    break
+                await asyncio.sleep(0.1)
+            assert cache.get('Орех', key) is None
+        finally:
+            await listener.stop()
+        assert cache.ttl == listener.fallback_ttl
+
+
+class TestBatchDeclension:
+    @pytest.mark.anyio
+    async def test_person_names_batch(self, declension_exception, client):
+        response = await client.post('/person_name/batch', json=[
+            {'fullname': "Шкитин Владимир Александрович", 'case': 'gent'},
+            {'fullname': 'Мерзлячкин Арбуз Арбузович', 'case': 'gent', 'gender': 'masc', 'system': 'Тест'},
+            {'fullname': "Сидорова Ольга Ларисовна", 'case': 'datv'},
+            {'fullname': "Шкитин Владимир Александрович", 'case': 'gent'},
+        ])
+        assert response.status_code == status.HTTP_200_OK
+        assert [item['result'] for item in response.json()] == [
+            "Шкитина Владимира Александровича",
+            'Мерзлячкину Арбуз Арбузовичу',
+            "Сидоровой Ольге Ларисовне",
+            "Шкитина Владимира Александровича",
+        ]
+
+    @pytest.mark.anyio
+    async def test_person_names_batch_item_error(self, client):
+        response = await client.post('/person_name/batch', json=[
+            {'fullname': " ", 'case': 'gent'},
+            {'fullname': "Фещенко Юрий Николаевич", 'case': 'gent'},
+        ])
+        first, second = response.json()
+        assert first['result'] is None and first['error']
+        assert second == {'result': "Фещенко Юрия Николаевича", 'error': None}
+
+    @pytest.mark.anyio
+    async def test_texts_batch_without_cache(self, declension_exception, client, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', False)
+        response = await client.post('/batch', json=[
+            {'source_text': "Сибирский торгово-промышленный", 'case': 'datv', 'number': 'plur'},
+            {'source_text': 'Мерзлячкин Арбуз Арбузович', 'case': 'gent', 'gender': 'masc', 'system': 'Тест'},
+            {'source_text': "Иванов Иван Иванович", 'case': 'gent'},
+        ])
+        assert [item['result'] for item in response.json()] == [
+            "Сибирским торгово-промышленным",
+            'Мерзлячкину Арбуз Арбузовичу',
+            "Иванова Ивана Ивановича",
+        ]
+
+    @pytest.mark.anyio
+    async def test_large_texts_batch_without_cache(self, declension_exception, client, monkeypatch):
+        # Фрагментов текстов больше, чем параметров в одном запросе asyncpg
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', False)
+        texts = [f'Сибирский торговый дом и склад {i} для Мерзлячкин Арбуз Арбузович' for i in range(1000)]
+        response = await client.post('/batch', json=[
+            {'source_text': text, 'case': 'gent', 'gender': 'masc', 'system': 'Тест'} for text in texts
+        ])
+        assert response.status_code == status.HTTP_200_OK
+        results = [item['result'] for item in response.json()]
+        assert len(results) == len(texts)
+        assert all(result.endswith('Мерзлячкину Арбуз Арбузовичу') for result in results)
+
+
+class TestStreamDeclension:
+    @pytest.mark.anyio
+    async def test_person_names_stream(self, declension_exception, client, monkeypatch):
+        monkeypatch.setattr(settings, 'stream_chunk_size', 2)
+        lines = [
+            '{"fullname": "Шкитин Владимир Александрович", "case": "gent"}',
+            '',
+            '{"fullname": "Мерзлячкин Арбуз Арбузович", "case": "gent", "gender": "masc", "system": "Тест"}',
+            '{"fullname": "Сидорова Ольга Ларисовна", "case": "unknown"}',
+            '{"fullname": "Сидорова Ольга Ларисовна", "case": "datv"}',
+        ]
+        response = await client.post('/person_name/stream', content='\n'.join(lines).encode(),
+                                     headers={'content-type': 'application/x-ndjson'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'] == 'application/x-ndjson'
+        results = [json.loads(line) for line in response.text.splitlines()]
+        assert [item['result'] for item in results] == [
+            "Шкитина Владимира Александровича",
+            'Мерзлячкину Арбуз Арбузовичу',
+            None,
+            "Сидоровой Ольге Ларисовне",
+        ]
+        assert results[2]['error']
+
+    @pytest.mark.anyio
+    async def test_texts_stream_line_too_long(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'stream_max_line_length', 100)
+        lines = [
+            '{"source_text": "%s", "case": "gent"}' % ('а' * 200),
+            '{"source_text": "Сибирский торгово-промышленный", "case": "gent"}',
+        ]
+        response = await client.post('/stream', content='\n'.join(lines).encode())
+        first, second = [json.loads(line) for line in response.text.splitlines()]
+        assert first['result'] is None and first['error']
+        assert second['result'] == "Сибирского торгово-промышленного"
+
+
+class TestBulkDeclension:
+    def test_csv(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', settings.exceptions_cache_enabled)
+        monkeypatch.setattr(exceptions_cache, 'ttl', exceptions_cache.ttl)
+        monkeypatch.setattr(declension_executor, 'mode', declension_executor.mode)
+        source, target, dump = tmp_path / 'source.csv', tmp_path / 'target.csv', tmp_path / 'exceptions.jsonl'
+        source.write_text('ФИО;case\nИванов Иван Иванович;gent\nСидорова Ольга Ларисовна;\n', encoding='utf-8')
+        dump.write_text(json.dumps({'source_text': 'Иванов Иван Иванович', 'case': 'gent', 'result': 'Иванова И.И.'},
+                                   ensure_ascii=False) + '\n', encoding='utf-8')
+        args = argparse.Namespace(input=source, output=target, kind='person_name', format=None, delimiter=';',
+                                  column=['fullname=ФИО'], case='datv', gender=None, number=None, system=None,
+                                  exceptions=str(dump), workers=1, chunk_size=1)
+        try:
+            assert bulk.run(args) == 2
+        finally:
+            # Индекс заполнен из выгрузки, при следующем обращении он перечитывается из базы
+            exceptions_cache.invalidate()
+        assert bulk._loop is None
+        with open(target, encoding='utf-8') as f:
+            rows = list(csv.DictReader(f, delimiter=';'))
+        assert [row['result'] for row in rows] == ['Иванова И.И.', 'Сидоровой Ольге Ларисовне']
+
+    @pytest.mark.anyio
+    async def test_no_database(self, monkeypatch):
+        monkeypatch.setattr(settings, 'exceptions_cache_enabled', True)
+        exceptions_cache.invalidate()
+        service = DeclensionExceptionsService(session_factory=None)
+        with pytest.raises(RuntimeError):
+            await service.get_single_result('Иванов', PersonNameDeclension(fullname='Иванов', case='gent'))
+
+
+class TestParadigmDeclension:
+    @pytest.mark.anyio
+    async def test_person_name_paradigm(self, declension_exception, client):
+        response = await client.post('/person_name/paradigm', json={
+            'fullname': 'Мерзлячкин Арбуз Арбузович',
+            'cases': ['datv', 'gent'],
+            'gender': 'masc',
+            'system': 'Тест'
+        })
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['results'] == {
+            'datv': 'Мерзлячкину Арбузу Арбузовичу',
+            'gent': 'Мерзлячкину Арбуз Арбузовичу',
+        }
+
+    @pytest.mark.anyio
+    async def test_person_name_paradigm_all_cases(self, client):
+        response = await client.post('/person_name/paradigm', json={
+            'fullname': "Сидорова Ольга Ларисовна",
+        })
+        assert response.json()['results'] == {
+            'nomn': "Сидорова Ольга Ларисовна",
+            'gent': "Сидоровой Ольги Ларисовны",
+            'datv': "Сидоровой Ольге Ларисовне",
+            'accs': "Сидорову Ольгу Ларисовну",
+            'ablt': "Сидоровой Ольгой Ларисовной",
+            'loct': "Сидоровой Ольге Ларисовне",
+        }
+
+    @pytest.mark.anyio
+    async def test_text_paradigm(self, client):
+        response = await client.post('/paradigm', json={
+            'source_text': "Сибирский торгово-промышленный",
+            'cases': ['gent', 'datv'],
+            'number': 'plur'
+        })
+        assert response.json()['results'] == {
+            'gent': "Сибирских торгово-промышленных",
+            'datv': "Сибирским торгово-промышленным",
+        }
+
+
+class TestMetrics:
+    def test_concurrent_updates(self):
+        counter = Counter('test_total', 'Тест', ['label'])
+        histogram = Histogram('test_seconds', 'Тест', ['label'])
+
+        def update():
+            for _ in range(10000):
+                counter.inc('a')
+                histogram.observe(0.001, 'a')
+
+        threads = [threading.Thread(target=update) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert 'test_total{label="a"} 40000' in counter.render()
+        assert 'test_seconds_count{label="a"} 40000' in histogram.render()
+
+    @pytest.mark.anyio
+    async def test_metrics(self, client):
+        await client.post('/', json={'source_text': "Сибирский торгово-промышленный", 'case': 'gent'})
+        response = await client.get('/metrics')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'].startswith('text/plain')
+        assert 'declension_requests_total{operation="text",system="",case="gent"}' in response.text
+        assert 'declension_duration_seconds_count{operation="text"}' in response.text
+        assert 'declension_cache_hit_ratio{cache="parse"}' in response.text
+        assert '# TYPE declension_cache_requests_total counter' in response.text
+
+    @pytest.mark.anyio
+    async def test_metrics_labels(self, client, monkeypatch):
+        monkeypatch.setattr(settings, 'metrics_systems', ['Известная'])
+        for system in ('Известная', 'Случайная 1', 'Случайная 2'):
+            await client.post('/', json={'source_text': 'Орех', 'case': 'loct', 'system': system})
+        await client.post('/paradigm', json={'source_text': 'Орех', 'cases': ['ablt'], 'system': 'Известная'})
+        response = await client.get('/metrics')
+        assert 'declension_requests_total{operation="text",system="Известная",case="loct"}' in response.text
+        assert 'declension_requests_total{operation="text",system="other",case="loct"}' in response.text
+        assert 'Случайная' not in response.text
+        assert 'declension_requests_total{operation="text",system="Известная",case="ablt"}' in response.text
+
+
+class TestReadiness:
+    @pytest.mark.anyio
+    async def test_readiness(self, client):
+        morphology.preload()
+        response = await client.get('/ready')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {'ready': True, 'morphology_loaded': True}
+
+    @pytest.mark.anyio
+    async def test_not_ready(self, client, monkeypatch):
+        monkeypatch.setattr(morphology, 'is_loaded', lambda: False)
+        monkeypatch.setattr(settings, 'morph_load_mode', 'background')
+        response = await client.get('/ready')
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
 class TestCasingManager:
 
     def test_get_words_casing(self):
@@ -359,4 +1015,103 @@ class TestCasingManager:
         target_text = "ооо пельменю ивану"
         expected_result = "ООО Пельменю Ивану"
         result = apply_cases(source_text, target_text)
-        assert expected_result == result
\ No newline at end of file
+        assert expected_result == result
+
+    @pytest.mark.parametrize('source_text, target_text, expected_result', [
+        ("ИНЖЕНЕР-программист ИТ-отдела", "инженеру-программисту ит-отдела", "ИНЖЕНЕРУ-программисту ИТ-отдела"),
+        ("МакДональдс «Ромашка»", "макдональдса «ромашки»", "МакДональдса «Ромашки»"),
+        ("Иван", "ИВАНУ", "ИванУ"),
+        ("ИВАНОВ Иван", "иванову", "ИВАНОВу"),
+        ("Иван", "ивану ивановичу", "Ивану ивановичу"),
+        ("Иван  Иванович", "ивану  ивановичу", "Ивану  Ивановичу"),
+    ])
+    def test_apply_cases_patterns(self, source_text, target_text, expected_result):
+        assert apply_cases(source_text, target_text) == expected_result
+
+
+class TestNamesTable:
+    @pytest.mark.parametrize('word', ['Иван', 'ольга', 'Ивановна', 'Влада', 'Тополиная'])
+    def test_matches_morphology(self, word):
+        for options in names_table.options_list:
+            assert names_table.lookup(word, options) == _inflect(word.lower(), options, animacy=True)
+
+    def test_unknown_word(self):
+        assert names_table.lookup('Мерзлячкин', frozenset({'gent'})) is None
+
+
+class TestTokenTrie:
+    def test_longest_match(self):
+        trie = TokenTrie([('Рога и копыта', 'Рогов и копыт'), ('Рога', 'Рогов'), ('и копыта', 'и копыт')])
+        assert trie.find('Директор Рога и копыта'.split()) == [(1, 4, 'Рогов и копыт')]
+        assert trie.find('Рога и Рога и копыта'.split()) == [(0, 1, 'Рогов'), (2, 5, 'Рогов и копыт')]
+        assert trie.find('Сено и копыта'.split()) == [(1, 3, 'и копыт')]
+
+    def test_max_words(self):
+        trie = TokenTrie([('Рога и копыта', 'Рогов и копыт'), ('Рога', 'Рогов')], max_words=2)
+        assert len(trie) == 1
+        assert trie.find('Рога и копыта'.split()) == [(0, 1, 'Рогов')]
+
+    def test_remove(self):
+        trie = TokenTrie([('Рога и копыта', 'Рогов и копыт'), ('Рога', 'Рогов')])
+        assert trie.find('Рога и копыта'.split()) == [(0, 3, 'Рогов и копыт')]
+        trie.remove('Рога и копыта')
+        assert len(trie) == 1
+        assert trie.find('Рога и копыта'.split()) == [(0, 1, 'Рогов')]
+
+
+class TestMemoCache:
+
+    def test_lru_eviction(self):
+        cache = MemoCache(2, 'lru')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is MISSING
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_lfu_eviction(self):
+        cache = MemoCache(2, 'lfu')
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('b')
+        cache.get('a')
+        cache.get('a')
+        cache.set('c', 3)
+        assert cache.get('b') is MISSING
+        assert cache.get('a') == 1
+
+    def test_stats(self):
+        cache = MemoCache(10)
+        cache.get('a')
+        cache.set('a', 1)
+        cache.get('a')
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 10}
+
+    def test_disabled(self):
+        cache = MemoCache(0)
+        cache.set('a', 1)
+        assert cache.get('a') is MISSING
+
+
+class TestDeclensionExecutor:
+
+    @pytest.mark.anyio
+    async def test_inline_below_threshold(self):
+        executor = DeclensionExecutor('thread', max_workers=1, threshold=10, max_queue_depth=0)
+        assert await executor.run(5, threading.current_thread) is threading.current_thread()
+        executor.shutdown()
+
+    @pytest.mark.anyio
+    async def test_queue_depth_limit(self):
+        executor = DeclensionExecutor('thread', max_workers=1, threshold=0, max_queue_depth=0)
+        release = threading.Event()
+        busy = asyncio.create_task(executor.run(1, release.wait))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc_info:
+            await executor.run(1, len, 'слово')
+        assert exc_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        release.set()
+        assert await busy is True
+        executor.shutdown()
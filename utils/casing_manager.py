@@ -1,36 +1,73 @@
-from typing import Iterable
+from functools import lru_cache
+from itertools import groupby
+from typing import Iterable, Optional
+
+
+LOWER, UPPER, TITLE, MIXED = range(4)
+
+# Участок слова в одном регистре: начало, конец, строчные ли буквы
+CaseRun = tuple[int, int, bool]
+# Шаблон регистра слова: вид, длина исходного слова, участки одного регистра (только для MIXED)
+WordPattern = tuple[int, int, Optional[tuple[CaseRun, ...]]]
 
 
 def get_words_casing(words: Iterable[str]) -> list[list[bool]]:
-    words_cases = []
-    for word in words:
-        letter_cases = []
-        for letter in word:
-            if letter.islower():
-                letter_cases.append(True)
-            else:
-                letter_cases.append(False)
-        words_cases.append(letter_cases)
-    return words_cases
+    """Побуквенная маска регистра: True для строчной буквы, False для остальных символов"""
+    return [list(map(str.islower, word)) for word in words]
+
+
+@lru_cache(maxsize=4096)
+def get_word_pattern(word: str) -> WordPattern:
+    mask = list(map(str.islower, word))
+    if all(mask):
+        return LOWER, len(mask), None
+    if not any(mask):
+        return UPPER, len(mask), None
+    if not mask[0] and all(mask[1:]):
+        return TITLE, len(mask), None
+    runs, start = [], 0
+    for is_lower, group in groupby(mask):
+        end = start + len(list(group))
+        runs.append((start, end, is_lower))
+        start = end
+    return MIXED, len(mask), tuple(runs)
+
+
+def _lower(text: str) -> str:
+    # str.lower учитывает контекст для сигмы в конце слова, побуквенное преобразование - нет
+    return text.lower() if 'Σ' not in text else ''.join(map(str.lower, text))
+
+
+def _apply_mask(word: str, mask: list[bool]) -> str:
+    head = ''.join(letter.lower() if is_lower else letter.upper() for letter, is_lower in zip(word, mask))
+    return head + word[len(mask):]
+
+
+def apply_word_pattern(word: str, pattern: WordPattern) -> str:
+    kind, length, runs = pattern
+    if kind == LOWER:
+        return _lower(word[:length]) + word[length:]
+    if kind == UPPER:
+        return word[:length].upper() + word[length:]
+    if kind == TITLE:
+        return word[:1].upper() + _lower(word[1:length]) + word[length:]
+    head = ''.join(_lower(word[start:end]) if is_lower else word[start:end].upper() for start, end, is_lower in runs)
+    return head + word[length:]
 
 
 def apply_words_cases(words: Iterable[str], words_cases: list[list[bool]]) -> list[str]:
-    new_words = []
-    for w_idx, word in enumerate(words):
-        new_word = ""
-        word_cases = None
-        for (l_idx, letter) in enumerate(word):
-            if w_idx < len(words_cases):
-                word_cases = words_cases[w_idx]
-            if word_cases and l_idx < len(word_cases):
-                new_word += letter.lower() if word_cases[l_idx] else letter.upper()
-            else:
-                new_word += letter
-        new_words.append(new_word)
-    return new_words
+    """Буквы за пределами маски и слова без маски остаются без изменений"""
+    words = list(words)
+    return [_apply_mask(word, word_cases) for word, word_cases in zip(words, words_cases)] + words[len(words_cases):]
 
 
 def apply_cases(source_text: str, target_text: str, sep: str = " ") -> str:
-    words_cases = get_words_casing(source_text.split(sep))
-    result = apply_words_cases(target_text.split(sep), words_cases)
+    """
+    Перенос регистра слов source_text на слова target_text. Для слов целиком в нижнем или верхнем регистре
+    и слов с заглавной буквы регистр применяется к слову целиком, слова в смешанном регистре обрабатываются
+    участками одного регистра
+    """
+    patterns = [get_word_pattern(word) for word in source_text.split(sep)]
+    words = target_text.split(sep)
+    result = [apply_word_pattern(word, pattern) for word, pattern in zip(words, patterns)] + words[len(patterns):]
     return sep.join(result)
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Hashable, Literal
+
+
+MISSING = object()
+
+EvictionPolicy = Literal['lru', 'lfu']
+
+
+class MemoCache:
+    """
+    Ограниченный кэш с вытеснением давно не использованных (lru) или редко используемых (lfu) записей.
+    maxsize=0 отключает кэширование.
+    """
+    def __init__(self, maxsize: int, policy: EvictionPolicy = 'lru', track_stats: bool = True):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f'Unknown eviction policy: {policy}')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.track_stats = track_stats
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._freq: dict[Hashable, int] = {}
+        self._freq_buckets: defaultdict[int, OrderedDict[Hashable, None]] = defaultdict(OrderedDict)
+        self._min_freq = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            if key not in self._data:
+                if self.track_stats:
+                    self.misses += 1
+                return default
+            if self.track_stats:
+                self.hits += 1
+            if self.policy == 'lru':
+                self._data.move_to_end(key)
+            else:
+                self._touch(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key in self._data:
+                self._data[key] = value
+                if self.policy == 'lru':
+                    self._data.move_to_end(key)
+                else:
+                    self._touch(key)
+                return
+            if len(self._data) >= self.maxsize:
+                self._evict()
+            self._data[key] = value
+            if self.policy == 'lfu':
+                self._freq[key] = 1
+                self._freq_buckets[1][key] = None
+                self._min_freq = 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._freq.clear()
+            self._freq_buckets.clear()
+            self._min_freq = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+    def _touch(self, key: Hashable):
+        freq = self._freq[key]
+        bucket = self._freq_buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._freq_buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._freq_buckets[freq + 1][key] = None
+
+    def _evict(self):
+        if self.policy == 'lru':
+            self._data.popitem(last=False)
+            return
+        bucket = self._freq_buckets[self._min_freq]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self._freq_buckets[self._min_freq]
+        del self._freq[key]
+        del self._data[key]
@@ -0,0 +1,46 @@
+from typing import AsyncIterable, AsyncIterator
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import Receive
+
+
+class LineTooLong(Exception):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_length: int) -> AsyncIterator[bytes | LineTooLong]:
+    """
+    Непустые строки потока байт. Вместо строки длиннее max_line_length возвращается LineTooLong,
+    сама строка не накапливается в памяти
+    """
+    buffer = b''
+    skipping = False
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b'\n')
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > max_line_length:
+                yield LineTooLong()
+            elif line.strip():
+                yield line
+        if len(buffer) > max_line_length:
+            if not skipping:
+                yield LineTooLong()
+            skipping = True
+            buffer = b''
+    if buffer.strip() and not skipping:
+        yield buffer
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    Потоковый ответ, который формируется одновременно с чтением тела запроса.
+    Стандартный StreamingResponse ожидает отключения клиента, читая receive, и забирал бы себе тело запроса,
+    поэтому отключение клиента обнаруживается при чтении запроса
+    """
+    media_type = 'application/x-ndjson'
+
+    async def listen_for_disconnect(self, receive: Receive) -> None:
+        await anyio.sleep_forever()
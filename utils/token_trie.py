@@ -0,0 +1,122 @@
+from collections import deque
+from typing import Iterable, Optional
+
+from .tokenizer import get_cores
+
+
+# Найденное вхождение: индекс первого слова, индекс слова после последнего, результат
+Match = tuple[int, int, str]
+
+
+class _Node:
+    __slots__ = ('children', 'fail', 'output', 'result', 'depth')
+
+    def __init__(self, depth: int):
+        self.children: dict[str, _Node] = {}
+        self.fail: Optional[_Node] = None
+        # Ближайший по суффиксным ссылкам узел с результатом
+        self.output: Optional[_Node] = None
+        self.result: Optional[str] = None
+        self.depth = depth
+
+
+class TokenTrie:
+    """
+    Префиксное дерево по словам текстов (без знаков препинания по краям) с суффиксными ссылками
+    (автомат Ахо-Корасик).
+    Находит вхождения всех текстов в последовательность слов за один проход по ней.
+    Ссылки перестраиваются при первом поиске после изменения дерева.
+    Тексты длиннее max_words слов не добавляются (None - без ограничения).
+    """
+    def __init__(self, items: Iterable[tuple[str, str]] = (), max_words: Optional[int] = None):
+        self.max_words = max_words
+        self._root = _Node(0)
+        self._linked = False
+        self._size = 0
+        for text, result in items:
+            self.add(text, result)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, text: str, result: str):
+        tokens = get_cores(text)
+        if self.max_words is not None and len(tokens) > self.max_words:
+            return
+        node = self._root
+        for token in tokens:
+            child = node.children.get(token)
+            if child is None:
+                child = node.children[token] = _Node(node.depth + 1)
+            node = child
+        if node is self._root:
+            return
+        self._size += node.result is None
+        node.result = result
+        self._linked = False
+
+    def remove(self, text: str):
+        path = [self._root]
+        tokens = get_cores(text)
+        for token in tokens:
+            child = path[-1].children.get(token)
+            if child is None:
+                return
+            path.append(child)
+        node = path[-1]
+        if node is self._root or node.result is None:
+            return
+        node.result = None
+        self._size -= 1
+        while len(path) > 1 and path[-1].result is None and not path[-1].children:
+            path.pop()
+            del path[-1].children[tokens[len(path) - 1]]
+        self._linked = False
+
+    def _link(self):
+        root = self._root
+        root.fail = root.output = None
+        queue = deque()
+        for child in root.children.values():
+            child.fail = root
+            child.output = None
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for token, child in node.children.items():
+                fail = node.fail
+                while fail is not root and token not in fail.children:
+                    fail = fail.fail
+                child.fail = fail.children.get(token, root)
+                child.output = child.fail if child.fail.result is not None else child.fail.output
+                queue.append(child)
+        self._linked = True
+
+    def find(self, words: list[str]) -> list[Match]:
+        """Непересекающиеся вхождения: из вхождений, начинающихся левее, выбирается самое длинное"""
+        if not self._size:
+            return []
+        if not self._linked:
+            self._link()
+        root = self._root
+        # Для каждого начального слова - конец самого длинного вхождения и его результат
+        longest: list[Optional[tuple[int, str]]] = [None] * len(words)
+        node = root
+        for end, word in enumerate(words, start=1):
+            while node is not root and word not in node.children:
+                node = node.fail
+            node = node.children.get(word, root)
+            found = node if node.result is not None else node.output
+            while found is not None:
+                # Вхождения с одним началом находятся в порядке возрастания длины
+                longest[end - found.depth] = (end, found.result)
+                found = found.output
+
+        matches = []
+        position = 0
+        for start, match in enumerate(longest):
+            if match is not None and start >= position:
+                end, result = match
+                matches.append((start, end, result))
+                position = end
+        return matches
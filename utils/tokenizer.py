@@ -0,0 +1,49 @@
+import re
+from typing import NamedTuple
+
+from .casing_manager import get_word_pattern, WordPattern
+
+
+_word_re = re.compile(r'\S+')
+_core_re = re.compile(r'(\W*)(.*?)(\W*)', re.DOTALL)
+# Кавычки, открывающие название в начале слова и закрывающие его в конце
+_opening_quotes = '«„“"'
+_closing_quotes = '»“”"'
+
+
+class Token(NamedTuple):
+    """
+    Слово текста между пробельными символами: положение в тексте, знаки препинания в начале и в конце,
+    слово без них, шаблон его регистра и признак слова в кавычках (названия в кавычках не склоняются)
+    """
+    start: int
+    end: int
+    prefix: str
+    core: str
+    suffix: str
+    pattern: WordPattern
+    quoted: bool = False
+
+
+def split_word(word: str) -> tuple[str, str, str]:
+    """Знаки препинания в начале, слово без них, знаки препинания в конце"""
+    if word[0].isalnum() and word[-1].isalnum():
+        return '', word, ''
+    return _core_re.fullmatch(word).groups()
+
+
+def tokenize(text: str) -> list[Token]:
+    tokens = []
+    # Число открытых кавычек перед словом
+    depth = 0
+    for match in _word_re.finditer(text):
+        prefix, core, suffix = split_word(match.group())
+        depth += sum(char in _opening_quotes for char in prefix)
+        tokens.append(Token(match.start(), match.end(), prefix, core, suffix, get_word_pattern(core), depth > 0))
+        depth = max(depth - sum(char in _closing_quotes for char in suffix), 0)
+    return tokens
+
+
+def get_cores(text: str) -> list[str]:
+    """Слова текста без знаков препинания по краям, как они склоняются и ищутся среди исключений"""
+    return [split_word(word)[1] for word in text.split()]